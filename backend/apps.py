@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BackendConfig(AppConfig):
     name = "backend"
+
+    def ready(self):
+        import backend.catalog_cache  # noqa: F401
+        import backend.checks  # noqa: F401
+        import backend.dictionaries  # noqa: F401
+        from backend.search import create_search_indexes
+
+        post_migrate.connect(create_search_indexes, sender=self)
@@ -0,0 +1,98 @@
+import hashlib
+from io import BytesIO
+from time import monotonic
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+from PIL import Image, UnidentifiedImageError
+
+from backend.fetch import CHUNK_SIZE, get_session
+from backend.models import User
+
+AVATAR_ALIAS_TARGET = "backend.User.avatar_thumbnail"
+AVATAR_FORMATS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+
+
+class AvatarError(Exception):
+    pass
+
+
+def download_avatar(url, max_size=None, timeout=None):
+    """Return the body at ``url``, refusing more than ``max_size`` bytes.
+
+    Network errors are raised as ``requests`` exceptions so the caller can
+    retry them; an oversized body or a failed request raise
+    :class:`AvatarError`.
+    """
+    max_size = max_size or settings.AVATAR_MAX_SIZE
+    timeout = timeout or settings.AVATAR_FETCH_TIMEOUT
+    deadline = monotonic() + timeout
+    with get_session().get(url, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise AvatarError(f"{url} answered {response.status_code}")
+        if int(response.headers.get("Content-Length") or 0) > max_size:
+            raise AvatarError(f"{url} is larger than {max_size} bytes")
+        content = BytesIO()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if content.tell() + len(chunk) > max_size:
+                raise AvatarError(f"{url} is larger than {max_size} bytes")
+            if monotonic() > deadline:
+                raise AvatarError(f"{url} took longer than {timeout} seconds")
+            content.write(chunk)
+    return content.getvalue()
+
+
+def _extension(content):
+    try:
+        with Image.open(BytesIO(content)) as image:
+            image.verify()
+            image_format = image.format
+    except (UnidentifiedImageError, OSError, SyntaxError) as error:
+        raise AvatarError(f"not an image: {error}") from error
+    if image_format not in AVATAR_FORMATS:
+        raise AvatarError(f"unsupported image format {image_format}")
+    return AVATAR_FORMATS[image_format]
+
+
+def generate_thumbnails(name):
+    """Create every configured avatar alias of ``name``, return their URLs."""
+    thumbnailer = get_thumbnailer(name)
+    return {
+        alias: thumbnailer.get_thumbnail(options).url
+        for alias, options in aliases.all(target=AVATAR_ALIAS_TARGET).items()
+    }
+
+
+def process_avatar(user):
+    """Download, store and thumbnail the avatar at ``user.avatar_url``.
+
+    Files are named after the SHA-256 of their content, so an image shared
+    by several users is stored and thumbnailed once; a user whose avatar did
+    not change is left alone. Returns the content hash.
+    """
+    content = download_avatar(user.avatar_url)
+    digest = hashlib.sha256(content).hexdigest()
+    if digest == user.avatar_hash and user.avatar_thumbnail:
+        return digest
+
+    existing = (
+        User.objects.filter(avatar_hash=digest)
+        .exclude(avatar_thumbnail="")
+        .values_list("avatar_thumbnail", "avatar_thumbnails")
+        .first()
+    )
+    if existing:
+        name, thumbnails = existing
+    else:
+        name = f"avatars/{digest}.{_extension(content)}"
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(content))
+        thumbnails = generate_thumbnails(name)
+
+    User.objects.filter(id=user.id).update(
+        avatar_thumbnail=name, avatar_hash=digest, avatar_thumbnails=thumbnails
+    )
+    return digest
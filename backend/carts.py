@@ -0,0 +1,340 @@
+from threading import RLock
+
+from django.conf import settings
+from django.db import transaction
+
+from backend.models import Order, OrderItem, ProductInfo
+
+
+def load_basket(user_id):
+    """Return the ``product_info_id -> quantity`` lines of a user's basket."""
+    return dict(
+        OrderItem.objects.filter(
+            order__user_id=user_id, order__state="basket"
+        ).values_list("product_info_id", "quantity")
+    )
+
+
+def save_basket(user_id, items, replace=False):
+    """Write cart lines to the user's basket ``Order``.
+
+    Lines with a zero quantity are removed, the others are upserted on
+    ``unique_order_item``. With ``replace`` lines missing from ``items`` are
+    removed as well. Lines of offers deleted since they were added to the
+    cart are dropped. Returns the basket order, if there is one.
+    """
+    items = dict(items)
+    available = set(
+        ProductInfo.objects.filter(
+            id__in=[pk for pk, quantity in items.items() if quantity > 0]
+        ).values_list("id", flat=True)
+    )
+    for pk, quantity in items.items():
+        if quantity > 0 and pk not in available:
+            items[pk] = 0
+    with transaction.atomic():
+        order = Order.objects.filter(user_id=user_id, state="basket").first()
+        if order is None:
+            if not any(items.values()):
+                return None
+            order = Order.objects.create(user_id=user_id, state="basket")
+        kept = {pk: quantity for pk, quantity in items.items() if quantity > 0}
+        removed = OrderItem.objects.filter(order=order)
+        if not replace:
+            removed = removed.filter(
+                product_info_id__in=[pk for pk in items if pk not in kept]
+            )
+        removed.exclude(product_info_id__in=kept).delete()
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product_info_id=pk, quantity=quantity)
+                for pk, quantity in kept.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["order", "product_info"],
+            update_fields=["quantity"],
+        )
+    return order
+
+
+def _parse_line(line):
+    if not isinstance(line, dict):
+        raise ValueError("Неверный формат позиции")
+    try:
+        pk = int(line.get("product_info_id"))
+        quantity = int(line.get("quantity", 1))
+    except (TypeError, ValueError):
+        raise ValueError("Неверный формат позиции")
+    if quantity < 0:
+        raise ValueError("Неверное количество")
+    return pk, quantity
+
+
+def apply_cart_lines(store, user_id, lines):
+    """Set the quantities of many cart lines at once.
+
+    Each line is ``{"product_info_id": ..., "quantity": ...}``; a zero
+    quantity removes the line. All offers are checked with one query and the
+    valid lines are written in one store update. Returns a result per line.
+    """
+    parsed = []
+    for line in lines:
+        try:
+            parsed.append(_parse_line(line))
+        except ValueError as error:
+            parsed.append(error)
+    ids = {line[0] for line in parsed if isinstance(line, tuple)}
+    stock = dict(
+        ProductInfo.objects.filter(id__in=ids, shop__state=True).values_list(
+            "id", "quantity"
+        )
+    )
+    cart = store.get(user_id)
+
+    results = []
+    changes = {}
+    for line in parsed:
+        if isinstance(line, ValueError):
+            results.append({"status": "error", "error": str(line)})
+            continue
+        pk, quantity = line
+        result = {"product_info": pk, "quantity": quantity}
+        results.append(result)
+        if pk in changes:
+            result.update(status="error", error="Позиция повторяется")
+        elif pk not in stock:
+            result.update(status="error", error="Товар не найден")
+        elif quantity > stock[pk]:
+            result.update(status="error", error="Недостаточно товара на складе")
+        elif quantity == 0:
+            changes[pk] = 0
+            result["status"] = "removed" if pk in cart else "unchanged"
+        else:
+            changes[pk] = quantity
+            if pk not in cart:
+                result["status"] = "added"
+            else:
+                result["status"] = "updated" if cart[pk] != quantity else "unchanged"
+    if changes:
+        store.update(user_id, changes)
+    return results
+
+
+def _save_carts(carts, mark_dirty, mark_saved=None):
+    """Persist ``(user_id, items)`` pairs, one failing cart at a time.
+
+    A cart that cannot be saved is marked dirty again and the others are
+    still saved; the first error is raised once all carts were tried.
+    """
+    saved = 0
+    error = None
+    for user_id, items in carts:
+        try:
+            save_basket(user_id, items, replace=True)
+        except Exception as failure:
+            mark_dirty(user_id)
+            error = error or failure
+        else:
+            if mark_saved:
+                mark_saved(user_id)
+            saved += 1
+    if error:
+        raise error
+    return saved
+
+
+class DatabaseCartStore:
+    """Carts read from and written to the basket order on every request."""
+
+    def get(self, user_id):
+        return load_basket(user_id)
+
+    def update(self, user_id, items):
+        save_basket(user_id, items)
+
+    def add(self, user_id, product_info_id, quantity):
+        items = self.get(user_id)
+        items[product_info_id] = items.get(product_info_id, 0) + quantity
+        self.update(user_id, {product_info_id: items[product_info_id]})
+
+    def flush(self, user_ids=None):
+        return 0
+
+    def forget(self, user_id):
+        pass
+
+
+class LocalCartStore:
+    """In-process cart store with write-behind persistence.
+
+    Carts are loaded from the database on first access, changed in memory
+    and only written back by :meth:`flush`. Meant for tests and single
+    process development servers, :class:`RedisCartStore` behaves the same
+    across processes.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._carts = {}
+        self._dirty = set()
+
+    def _load(self, user_id):
+        if user_id not in self._carts:
+            items = load_basket(user_id)
+            with self._lock:
+                self._carts.setdefault(user_id, items)
+        return self._carts[user_id]
+
+    def get(self, user_id):
+        cart = self._load(user_id)
+        with self._lock:
+            return dict(cart)
+
+    def update(self, user_id, items):
+        cart = self._load(user_id)
+        with self._lock:
+            for pk, quantity in items.items():
+                if quantity > 0:
+                    cart[pk] = quantity
+                else:
+                    cart.pop(pk, None)
+            self._dirty.add(user_id)
+
+    def add(self, user_id, product_info_id, quantity):
+        cart = self._load(user_id)
+        with self._lock:
+            cart[product_info_id] = cart.get(product_info_id, 0) + quantity
+            self._dirty.add(user_id)
+
+    def flush(self, user_ids=None):
+        """Persist changed carts, all of them unless ``user_ids`` is given."""
+        with self._lock:
+            dirty = (
+                self._dirty.copy() if user_ids is None else self._dirty & set(user_ids)
+            )
+            self._dirty -= dirty
+            carts = {user_id: dict(self._carts[user_id]) for user_id in dirty}
+        return _save_carts(carts.items(), self._mark_dirty)
+
+    def _mark_dirty(self, user_id):
+        with self._lock:
+            self._dirty.add(user_id)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._carts.pop(user_id, None)
+            self._dirty.discard(user_id)
+
+
+class RedisCartStore:
+    """Carts kept in Redis hashes, persisted to the database by :meth:`flush`.
+
+    Each cart is a hash of ``product_info_id -> quantity`` plus a marker
+    field, so an empty but loaded cart is told apart from one that has not
+    been read from the database yet. Changed carts are listed in a set; a
+    flushed cart expires after ``CART_STORE_TTL`` seconds of inactivity.
+    """
+
+    LOADED = "loaded"
+    DIRTY_KEY = "carts:dirty"
+
+    def __init__(self, client, ttl):
+        self.client = client
+        self.ttl = ttl
+
+    def _key(self, user_id):
+        return f"cart:{user_id}"
+
+    def _decode(self, raw):
+        return {
+            int(pk): int(quantity)
+            for pk, quantity in raw.items()
+            if pk.decode() != self.LOADED
+        }
+
+    def _load(self, user_id):
+        raw = self.client.hgetall(self._key(user_id))
+        if raw:
+            return self._decode(raw)
+        items = load_basket(user_id)
+        pipe = self.client.pipeline()
+        pipe.hsetnx(self._key(user_id), self.LOADED, 1)
+        for pk, quantity in items.items():
+            pipe.hsetnx(self._key(user_id), pk, quantity)
+        pipe.expire(self._key(user_id), self.ttl)
+        pipe.execute()
+        return items
+
+    def get(self, user_id):
+        return self._load(user_id)
+
+    def update(self, user_id, items):
+        self._load(user_id)
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        for pk, quantity in items.items():
+            if quantity > 0:
+                pipe.hset(key, pk, quantity)
+            else:
+                pipe.hdel(key, pk)
+        pipe.persist(key)
+        pipe.sadd(self.DIRTY_KEY, user_id)
+        pipe.execute()
+
+    def add(self, user_id, product_info_id, quantity):
+        self._load(user_id)
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, product_info_id, quantity)
+        pipe.persist(key)
+        pipe.sadd(self.DIRTY_KEY, user_id)
+        pipe.execute()
+
+    def flush(self, user_ids=None):
+        if user_ids is None:
+            user_ids = [
+                int(user_id) for user_id in self.client.smembers(self.DIRTY_KEY)
+            ]
+        carts = [
+            (user_id, self._decode(self.client.hgetall(self._key(user_id))))
+            for user_id in user_ids
+            # a change made while saving marks the cart dirty again
+            if self.client.srem(self.DIRTY_KEY, user_id)
+        ]
+        return _save_carts(carts, self._mark_dirty, self._mark_saved)
+
+    def _mark_dirty(self, user_id):
+        self.client.sadd(self.DIRTY_KEY, user_id)
+
+    def _mark_saved(self, user_id):
+        self.client.expire(self._key(user_id), self.ttl)
+
+    def forget(self, user_id):
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(user_id))
+        pipe.srem(self.DIRTY_KEY, user_id)
+        pipe.execute()
+
+
+_store = None
+
+
+def get_cart_store():
+    global _store
+    if _store is None:
+        if settings.CART_STORE == "redis":
+            import redis
+
+            _store = RedisCartStore(
+                redis.Redis.from_url(settings.CART_STORE_URL), settings.CART_STORE_TTL
+            )
+        elif settings.CART_STORE == "local":
+            _store = LocalCartStore()
+        else:
+            _store = DatabaseCartStore()
+    return _store
+
+
+def reset_cart_store():
+    global _store
+    _store = None
@@ -0,0 +1,150 @@
+from hashlib import sha1
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from backend.models import Shop, Category, Product, ProductInfo
+
+VERSION_KEY = "catalog:version"
+MODIFIED_KEY = "catalog:modified"
+HITS_KEY = "catalog:hits"
+MISSES_KEY = "catalog:misses"
+
+
+def catalog_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def get_catalog_version():
+    """Return the current catalog version, a counter bumped on every change."""
+    cache = catalog_cache()
+    cache.add(VERSION_KEY, 1, timeout=None)
+    return cache.get(VERSION_KEY, 1)
+
+
+def get_catalog_modified():
+    """Return the time of the last catalog change, never later than now."""
+    now = time.time()
+    cache = catalog_cache()
+    cache.add(MODIFIED_KEY, now, timeout=None)
+    return min(cache.get(MODIFIED_KEY, now), now)
+
+
+def bump_catalog_version():
+    cache = catalog_cache()
+    cache.add(VERSION_KEY, 1, timeout=None)
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        version = get_catalog_version()
+    cache.set(MODIFIED_KEY, time.time(), timeout=None)
+    return version
+
+
+def bump_catalog_version_on_commit():
+    transaction.on_commit(bump_catalog_version)
+
+
+def _count(key):
+    cache = catalog_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def cache_stats():
+    cache = catalog_cache()
+    return {
+        "hits": cache.get(HITS_KEY, 0),
+        "misses": cache.get(MISSES_KEY, 0),
+        "version": get_catalog_version(),
+    }
+
+
+def get_stock_window():
+    """Return the start of the current stock window.
+
+    Checkouts change stock without bumping the catalog version, so cached
+    responses only live for ``CATALOG_STOCK_TIMEOUT`` seconds and show stock
+    at most that old.
+    """
+    timeout = settings.CATALOG_STOCK_TIMEOUT
+    return int(time.time() // timeout * timeout)
+
+
+class CatalogCacheMixin:
+    """Caches successful GET responses until the catalog version changes.
+
+    Every completed import bumps the version, which moves all cached
+    responses to new keys at once; stale entries simply expire. Together
+    with the stock window the version backs the ``ETag`` and the time of the
+    last change ``Last-Modified``, so a client polling an unchanged catalog
+    gets a 304 after a single cache lookup.
+    """
+
+    def get_request_digest(self, request):
+        query = sorted(request.query_params.lists())
+        return sha1(f"{request.path}?{query}".encode()).hexdigest()
+
+    def get_cache_key(self, request, version):
+        return f"catalog:response:{version}:{self.get_request_digest(request)}"
+
+    def get_etag(self, request, version):
+        digest = self.get_request_digest(request)[:16]
+        return quote_etag(f"{version}-{digest}-{request.accepted_renderer.format}")
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return "*" in etags or etag in etags
+        if_modified_since = parse_http_date_safe(
+            request.headers.get("If-Modified-Since", "")
+        )
+        return if_modified_since is not None and last_modified <= if_modified_since
+
+    def get(self, request, *args, **kwargs):
+        window = get_stock_window()
+        version = f"{get_catalog_version()}.{window}"
+        etag = self.get_etag(request, version)
+        last_modified = int(max(get_catalog_modified(), window))
+        headers = {"ETag": etag, "Last-Modified": http_date(last_modified)}
+        if self.is_not_modified(request, etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache = catalog_cache()
+        key = self.get_cache_key(request, version)
+        data = cache.get(key)
+        if data is not None:
+            _count(HITS_KEY)
+            return Response(data, headers={"X-Cache": "HIT", **headers})
+
+        _count(MISSES_KEY)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.CATALOG_STOCK_TIMEOUT)
+            for header, value in headers.items():
+                response[header] = value
+        response["X-Cache"] = "MISS"
+        return response
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductInfo)
+@receiver(post_delete, sender=Shop)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductInfo)
+def bump_on_catalog_change(sender, **kwargs):
+    bump_catalog_version_on_commit()
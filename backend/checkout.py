@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from backend.models import Order, OrderItem, ProductInfo
+from backend.offers import refresh_best_offers
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyBasket(CheckoutError):
+    pass
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, shortages):
+        super().__init__("Недостаточно товара на складе")
+        # product_info id -> (requested, available)
+        self.shortages = shortages
+
+
+def _requested(quantities):
+    return Case(
+        *(When(id=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+        default=Value(0),
+    )
+
+
+def _reserve(quantities):
+    """Take ``quantities`` off the stock of one shop's offers in one UPDATE.
+
+    Every row is decremented only if it still holds enough units and its
+    shop takes orders, so the statement either touches all rows or reports
+    a shortage. Offers of a disabled shop count as out of stock.
+    """
+    requested = _requested(quantities)
+    reserved = ProductInfo.objects.filter(
+        id__in=quantities.keys(), quantity__gte=requested, shop__state=True
+    ).update(quantity=F("quantity") - requested)
+    if reserved == len(quantities):
+        return
+    available = dict(
+        ProductInfo.objects.filter(
+            id__in=quantities.keys(), shop__state=True
+        ).values_list("id", "quantity")
+    )
+    raise OutOfStock(
+        {
+            pk: (quantity, available.get(pk, 0))
+            for pk, quantity in quantities.items()
+            if available.get(pk, 0) < quantity
+        }
+    )
+
+
+def checkout(order, contact=None):
+    """Turn the basket ``order`` into a new order and reserve its stock.
+
+    The basket is claimed with a conditional UPDATE, so a second checkout of
+    the same basket does nothing, and stock is reserved with one conditional
+    decrement per shop instead of locking every row up front. Any shortage
+    rolls the whole checkout back and raises :class:`OutOfStock`. Once
+    committed, the best offers of the ordered products are recomputed.
+    """
+    with transaction.atomic():
+        claimed = Order.objects.filter(id=order.id, state="basket").update(
+            state="new", contact=contact, updated_at=timezone.now()
+        )
+        if not claimed:
+            raise CheckoutError("Корзина уже оформлена")
+
+        lines = OrderItem.objects.filter(order_id=order.id).values_list(
+            "product_info_id",
+            "product_info__shop_id",
+            "product_info__product_id",
+            "quantity",
+        )
+        by_shop = defaultdict(dict)
+        product_ids = set()
+        for product_info_id, shop_id, product_id, quantity in lines:
+            by_shop[shop_id][product_info_id] = quantity
+            product_ids.add(product_id)
+        if not by_shop:
+            raise EmptyBasket("Корзина пуста")
+
+        shortages = {}
+        # a fixed order keeps concurrent checkouts from deadlocking
+        for _, quantities in sorted(by_shop.items(), key=lambda item: item[0] or 0):
+            try:
+                _reserve(quantities)
+            except OutOfStock as error:
+                shortages.update(error.shortages)
+        if shortages:
+            raise OutOfStock(shortages)
+        # best offers carry the old stock; cached catalog responses catch up
+        # within CATALOG_STOCK_TIMEOUT
+        transaction.on_commit(lambda: refresh_best_offers(product_ids))
+    order.state = "new"
+    order.contact = contact
+    return order
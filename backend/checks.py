@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from django.core.cache.backends.locmem import LocMemCache
+
+from backend.catalog_cache import catalog_cache
+
+
+@register()
+def check_catalog_cache(app_configs, **kwargs):
+    """Every worker has to see the same catalog version and cached responses."""
+    if settings.DEBUG or not isinstance(catalog_cache(), LocMemCache):
+        return []
+    return [
+        Error(
+            "The catalog cache is local to each process.",
+            hint="Set CATALOG_CACHE_URL to a Redis server shared by all workers.",
+            id="backend.E001",
+        )
+    ]
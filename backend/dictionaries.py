@@ -0,0 +1,229 @@
+from threading import RLock
+from time import monotonic
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend.catalog_cache import catalog_cache
+from backend.models import Category, Parameter
+
+
+class DictionaryCache:
+    """Process-wide ``name <-> id`` map of a small dimension table.
+
+    The table is loaded once on first use and then only queried for names
+    or ids it has not seen yet. Rows created through the cache are published
+    to other threads when the creating transaction commits, so a rolled back
+    import never leaves dangling ids behind. Concurrent importers in other
+    processes are handled by the database: inserts ignore conflicts and the
+    rows are read back afterwards.
+
+    Renames and deletes bump a version kept in the shared catalog cache.
+    Every process compares it with the version its map was loaded at, at
+    most once per ``DICTIONARY_CHECK_INTERVAL`` seconds, and starts over
+    when it moved.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version_key = f"dictionary:{model._meta.label_lower}:version"
+        self._lock = RLock()
+        self._ids = {}
+        self._names = {}
+        self._loaded = False
+        self._version = None
+        self._checked_at = None
+
+    def __deepcopy__(self, memo):
+        # serializer fields are deep-copied per instance, the cache is shared
+        return self
+
+    def _store(self, rows):
+        with self._lock:
+            for pk, name in rows:
+                previous = self._names.get(pk)
+                if previous != name and self._ids.get(previous) == pk:
+                    del self._ids[previous]
+                self._ids[name] = pk
+                self._names[pk] = name
+
+    def _store_on_commit(self, rows):
+        transaction.on_commit(lambda: self._store(rows))
+
+    def get_version(self):
+        cache = catalog_cache()
+        cache.add(self.version_key, 0, timeout=None)
+        return cache.get(self.version_key, 0)
+
+    def bump_version(self):
+        cache = catalog_cache()
+        cache.add(self.version_key, 0, timeout=None)
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            pass
+
+    def bump_version_on_commit(self):
+        transaction.on_commit(self.bump_version)
+
+    def _check_version(self):
+        now = monotonic()
+        if (
+            self._checked_at is not None
+            and now - self._checked_at < settings.DICTIONARY_CHECK_INTERVAL
+        ):
+            return
+        version = self.get_version()
+        with self._lock:
+            if version != self._version:
+                self._ids.clear()
+                self._names.clear()
+                self._loaded = False
+                self._version = version
+            self._checked_at = now
+
+    def _load(self):
+        self._check_version()
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._store(self.model.objects.values_list("id", "name"))
+                self._loaded = True
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self._names.clear()
+            self._loaded = False
+            self._version = None
+            self._checked_at = None
+
+    def forget(self, pk):
+        with self._lock:
+            name = self._names.pop(pk, None)
+            if self._ids.get(name) == pk:
+                del self._ids[name]
+
+    def get_ids(self, names, create=False):
+        """Return a ``name -> id`` dict, creating missing rows if asked to."""
+        self._load()
+        with self._lock:
+            found = {name: self._ids[name] for name in names if name in self._ids}
+        missing = set(names).difference(found)
+        if not missing:
+            return found
+        rows = list(
+            self.model.objects.filter(name__in=missing).values_list("id", "name")
+        )
+        self._store(rows)
+        if create and len(rows) < len(missing):
+            known = {name for _, name in rows}
+            self.model.objects.bulk_create(
+                [self.model(name=name) for name in missing - known],
+                ignore_conflicts=True,
+            )
+            created = list(
+                self.model.objects.filter(name__in=missing - known).values_list(
+                    "id", "name"
+                )
+            )
+            self._store_on_commit(created)
+            rows += created
+        found.update((name, pk) for pk, name in rows)
+        return found
+
+    def ensure(self, names):
+        """Make sure rows with the given ``id -> name`` pairs exist.
+
+        Missing rows are created. Rows are shared by every shop, so an id
+        that exists under another name is not renamed but reported with a
+        ``ValueError``, which fails the import that asked for it.
+        """
+        self._load()
+        with self._lock:
+            changed = {
+                pk: name for pk, name in names.items() if self._names.get(pk) != name
+            }
+        if not changed:
+            return
+        current = dict(
+            self.model.objects.filter(id__in=changed.keys()).values_list("id", "name")
+        )
+        self._store(current.items())
+        missing = {pk: name for pk, name in changed.items() if pk not in current}
+        if missing:
+            self.model.objects.bulk_create(
+                [self.model(id=pk, name=name) for pk, name in missing.items()],
+                ignore_conflicts=True,
+            )
+            # rows inserted by a concurrent import may carry another name
+            created = dict(
+                self.model.objects.filter(id__in=missing.keys()).values_list(
+                    "id", "name"
+                )
+            )
+            self._store_on_commit(list(created.items()))
+            current.update(created)
+        conflicts = [
+            f"{pk}: «{current.get(pk, '')}» вместо «{name}»"
+            for pk, name in sorted(changed.items())
+            if current.get(pk) != name
+        ]
+        if conflicts:
+            raise ValueError(
+                f"{self.model._meta.verbose_name} с другим названием: "
+                + ", ".join(conflicts)
+            )
+
+    def get_names(self, ids):
+        """Return an ``id -> name`` dict, loading unknown ids in one query."""
+        self._load()
+        with self._lock:
+            found = {pk: self._names[pk] for pk in ids if pk in self._names}
+        missing = set(ids).difference(found)
+        if missing:
+            rows = list(
+                self.model.objects.filter(id__in=missing).values_list("id", "name")
+            )
+            self._store(rows)
+            found.update(rows)
+        return found
+
+    def get_name(self, pk):
+        self._load()
+        with self._lock:
+            name = self._names.get(pk)
+        if name is None:
+            rows = list(self.model.objects.filter(id=pk).values_list("id", "name"))
+            self._store(rows)
+            name = rows[0][1] if rows else None
+        return name
+
+
+category_names = DictionaryCache(Category)
+parameter_names = DictionaryCache(Parameter)
+
+_caches = {Category: category_names, Parameter: parameter_names}
+
+
+def clear_dictionaries():
+    for cache in _caches.values():
+        cache.clear()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Parameter)
+def remember_dictionary_row(sender, instance, created, **kwargs):
+    _caches[sender]._store([(instance.pk, instance.name)])
+    if not created:
+        _caches[sender].bump_version_on_commit()
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Parameter)
+def forget_dictionary_row(sender, instance, **kwargs):
+    _caches[sender].forget(instance.pk)
+    _caches[sender].bump_version_on_commit()
@@ -0,0 +1,179 @@
+from django.conf import settings
+from django.db.models import Count, Q
+
+from backend.dictionaries import parameter_names
+from backend.models import FacetCount, ProductInfo, ProductParameter
+
+
+def parse_facet_filters(request):
+    """Read ``?parameter=<name>:<value>`` filters into ``(id, value)`` pairs.
+
+    Returns ``None`` when a filter names an unknown parameter, since no
+    offer can match it.
+    """
+    filters = []
+    for raw in request.query_params.getlist("parameter"):
+        name, separator, value = raw.partition(":")
+        if separator:
+            filters.append((name.strip(), value.strip()))
+    if not filters:
+        return filters
+    ids = parameter_names.get_ids({name for name, _ in filters})
+    if len(ids) < len({name for name, _ in filters}):
+        return None
+    return [(ids[name], value) for name, value in filters]
+
+
+def _group_filters(filters):
+    values = {}
+    for parameter_id, value in filters:
+        values.setdefault(parameter_id, []).append(value)
+    return values
+
+
+def filter_offers(filters, queryset=None):
+    """Narrow ``queryset`` to offers matching ``filters``.
+
+    Values of one parameter are alternatives, different parameters must all
+    match.
+    """
+    if queryset is None:
+        queryset = ProductInfo.objects.all()
+    for parameter_id, choices in _group_filters(filters).items():
+        queryset = queryset.filter(
+            id__in=ProductParameter.objects.filter(
+                parameter_id=parameter_id, value__in=choices
+            ).values("product_info_id")
+        )
+    return queryset
+
+
+def filter_products(queryset, filters):
+    if filters is None:
+        return queryset.none()
+    if not filters:
+        return queryset
+    return queryset.filter(id__in=filter_offers(filters).values("product_id"))
+
+
+def _live_counts(filters, parameters):
+    return (
+        ProductParameter.objects.filter(
+            parameters, product_info__in=filter_offers(filters)
+        )
+        .values_list("parameter_id", "value")
+        .annotate(offers=Count("id"))
+        .order_by()
+    )
+
+
+def facet_counts(filters):
+    """Return ``{parameter_id: {value: offers}}`` for the filtered offers.
+
+    Each filtered parameter is counted without its own filter, so all of
+    its values stay selectable. Counts that no other parameter constrains
+    come straight from the precomputed ``FacetCount`` table, the rest are
+    counted over the matching offers.
+    """
+    if filters is None:
+        return {}
+    groups = _group_filters(filters)
+    queries = []
+    for parameter_id in groups:
+        others = [item for item in filters if item[0] != parameter_id]
+        if others:
+            queries.append(_live_counts(others, Q(parameter_id=parameter_id)))
+        else:
+            queries.append(
+                FacetCount.objects.filter(parameter_id=parameter_id).values_list(
+                    "parameter_id", "value", "offers"
+                )
+            )
+    if filters:
+        queries.append(_live_counts(filters, ~Q(parameter_id__in=list(groups))))
+    else:
+        queries.append(
+            FacetCount.objects.values_list("parameter_id", "value", "offers")
+        )
+    counts = {}
+    for rows in queries:
+        for parameter_id, value, offers in rows:
+            counts.setdefault(parameter_id, {})[value] = offers
+    return counts
+
+
+def _apply_facet_chunk(keys, deltas):
+    FacetCount.objects.bulk_create(
+        [
+            FacetCount(parameter_id=parameter_id, value=value, offers=0)
+            for parameter_id, value in keys
+        ],
+        ignore_conflicts=True,
+    )
+    condition = Q()
+    for parameter_id, values in _group_filters(keys).items():
+        condition |= Q(parameter_id=parameter_id, value__in=values)
+    rows = list(
+        FacetCount.objects.filter(condition)
+        .order_by("parameter_id", "value")
+        .select_for_update()
+    )
+    for row in rows:
+        row.offers = max(row.offers + deltas[(row.parameter_id, row.value)], 0)
+    FacetCount.objects.bulk_update([row for row in rows if row.offers], ["offers"])
+    FacetCount.objects.filter(
+        id__in=[row.id for row in rows if not row.offers]
+    ).delete()
+
+
+def apply_facet_deltas(deltas, batch_size=None):
+    """Add signed per-value ``deltas`` to the precomputed facet counts.
+
+    ``deltas`` maps ``(parameter_id, value)`` to the change in the number of
+    offers. Runs inside the caller's transaction: missing rows are created
+    first, then the affected rows are locked in a fixed order, chunk by
+    chunk, so concurrent imports touching the same values queue up instead
+    of clashing on ``unique_facet_count`` or losing each other's counts.
+    Values left without offers are removed.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    keys = sorted(key for key, delta in deltas.items() if delta)
+    for start in range(0, len(keys), batch_size):
+        _apply_facet_chunk(keys[start : start + batch_size], deltas)
+
+
+def rebuild_facet_counts():
+    """Recount every facet from ``ProductParameter``.
+
+    Repairs counts that drifted through changes the importer did not make,
+    such as deleted shops or edits in the admin.
+    """
+    counts = {
+        (parameter_id, value): offers
+        for parameter_id, value, offers in ProductParameter.objects.values_list(
+            "parameter_id", "value"
+        )
+        .annotate(offers=Count("id"))
+        .order_by()
+    }
+    FacetCount.objects.bulk_create(
+        [
+            FacetCount(parameter_id=parameter_id, value=value, offers=offers)
+            for (parameter_id, value), offers in counts.items()
+        ],
+        batch_size=settings.IMPORT_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["parameter", "value"],
+        update_fields=["offers"],
+    )
+    stale = [
+        pk
+        for pk, parameter_id, value in FacetCount.objects.values_list(
+            "id", "parameter_id", "value"
+        ).iterator()
+        if (parameter_id, value) not in counts
+    ]
+    for start in range(0, len(stale), settings.IMPORT_BATCH_SIZE):
+        FacetCount.objects.filter(
+            id__in=stale[start : start + settings.IMPORT_BATCH_SIZE]
+        ).delete()
@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from tempfile import TemporaryFile
+from time import monotonic
+from typing import IO, Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 64 * 1024
+
+_session = None
+
+
+class PriceListFetchError(Exception):
+    pass
+
+
+class PriceListTooLarge(PriceListFetchError):
+    pass
+
+
+@dataclass
+class FetchResult:
+    not_modified: bool
+    file: Optional[IO[bytes]] = None
+    size: int = 0
+    etag: str = ""
+    last_modified: str = ""
+
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.PRICE_LIST_POOL_SIZE,
+            pool_maxsize=settings.PRICE_LIST_POOL_SIZE,
+        )
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def _conditional_headers(shop, url):
+    headers = {}
+    if url == shop.url:
+        if shop.etag:
+            headers["If-None-Match"] = shop.etag
+        if shop.last_modified:
+            headers["If-Modified-Since"] = shop.last_modified
+    return headers
+
+
+@contextmanager
+def fetch_price_list(shop, url, max_size=None, timeout=None):
+    """Download the price list at ``url`` into a temporary file.
+
+    The validators stored on ``shop`` are sent along when ``url`` is the
+    shop's current price list, so an unchanged file is answered with 304 and
+    ``FetchResult.not_modified`` set instead of being downloaded again. The
+    body is streamed to disk and the download is aborted once it exceeds
+    ``max_size`` bytes or takes longer than ``timeout`` seconds.
+    """
+    max_size = max_size or settings.PRICE_LIST_MAX_SIZE
+    timeout = timeout or settings.PRICE_LIST_FETCH_TIMEOUT
+    deadline = monotonic() + timeout
+    try:
+        response = get_session().get(
+            url,
+            headers=_conditional_headers(shop, url),
+            stream=True,
+            timeout=timeout,
+        )
+    except requests.RequestException as error:
+        raise PriceListFetchError(str(error)) from error
+
+    with response, TemporaryFile() as file:
+        if response.status_code == 304:
+            yield FetchResult(not_modified=True)
+            return
+        if response.status_code != 200:
+            raise PriceListFetchError(f"{url} answered {response.status_code}")
+        if int(response.headers.get("Content-Length") or 0) > max_size:
+            raise PriceListTooLarge(f"{url} is larger than {max_size} bytes")
+
+        size = 0
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise PriceListTooLarge(f"{url} is larger than {max_size} bytes")
+                if monotonic() > deadline:
+                    raise PriceListFetchError(
+                        f"{url} took longer than {timeout} seconds"
+                    )
+                file.write(chunk)
+        except requests.RequestException as error:
+            raise PriceListFetchError(str(error)) from error
+        file.seek(0)
+        yield FetchResult(
+            not_modified=False,
+            file=file,
+            size=size,
+            etag=response.headers.get("ETag", ""),
+            last_modified=response.headers.get("Last-Modified", ""),
+        )
@@ -0,0 +1,299 @@
+from collections import Counter
+from dataclasses import dataclass, field
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from backend.catalog_cache import bump_catalog_version_on_commit
+from backend.dictionaries import category_names, parameter_names
+from backend.facets import apply_facet_deltas
+from backend.offers import refresh_best_offers
+from backend.search import index_products_on_commit
+from backend.models import (
+    Category,
+    OrderItem,
+    Product,
+    ProductInfo,
+    ProductParameter,
+    Shop,
+)
+
+
+@dataclass
+class ImportResult:
+    categories: int = 0
+    products_created: int = 0
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    facet_deltas: Counter = field(default_factory=Counter)
+    touched_products: set = field(default_factory=set)
+
+
+def _import_categories(shop, categories, result):
+    names = {category["id"]: category["name"] for category in categories}
+    category_names.ensure(names)
+    through = Category.shops.through
+    linked = set(
+        through.objects.filter(
+            shop_id=shop.id, category_id__in=names.keys()
+        ).values_list("category_id", flat=True)
+    )
+    through.objects.bulk_create(
+        [through(category_id=pk, shop_id=shop.id) for pk in names if pk not in linked],
+        ignore_conflicts=True,
+    )
+    result.categories += len(names)
+
+
+def _product_ids(keys):
+    return {
+        (name, category_id): pk
+        for pk, name, category_id in Product.objects.filter(
+            name__in={name for name, _ in keys},
+            category_id__in={category_id for _, category_id in keys},
+        ).values_list("id", "name", "category_id")
+    }
+
+
+def _resolve_products(goods, result):
+    """Map ``(name, category)`` of ``goods`` to product ids.
+
+    Missing products are inserted ignoring conflicts on ``unique_product``
+    and read back, so imports of different shops running at the same time
+    share one product instead of each creating its own.
+    """
+    keys = dict.fromkeys((item["name"], item["category"]) for item in goods)
+    products = _product_ids(keys)
+    missing = sorted(key for key in keys if key not in products)
+    if missing:
+        Product.objects.bulk_create(
+            [
+                Product(name=name, category_id=category_id)
+                for name, category_id in missing
+            ],
+            ignore_conflicts=True,
+        )
+        created = _product_ids(missing)
+        products.update(created)
+        index_products_on_commit((pk, name) for (name, _), pk in created.items())
+        result.products_created += len(created)
+    return products
+
+
+def _resolve_parameters(goods, parameters):
+    names = {name for item in goods for name in item["parameters"]}
+    names.difference_update(parameters)
+    if names:
+        parameters.update(parameter_names.get_ids(names, create=True))
+
+
+def content_hash(item):
+    payload = json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+def _sync_parameters(goods, product_infos, parameters, created, result):
+    """Bring ``ProductParameter`` rows of ``product_infos`` in line with ``goods``.
+
+    Rows of freshly ``created`` offers are inserted, rows of existing offers
+    are diffed so only added, changed and dropped parameters are written.
+    """
+    wanted = {
+        (product_info.pk, parameters[name]): str(value)
+        for item, product_info in zip(goods, product_infos)
+        for name, value in item["parameters"].items()
+    }
+    current = {}
+    existing_ids = [
+        product_info.pk
+        for product_info, is_new in zip(product_infos, created)
+        if not is_new
+    ]
+    if existing_ids:
+        current = {
+            (product_info_id, parameter_id): (pk, value)
+            for pk, product_info_id, parameter_id, value in (
+                ProductParameter.objects.filter(
+                    product_info_id__in=existing_ids
+                ).values_list("id", "product_info_id", "parameter_id", "value")
+            )
+        }
+    dropped = [key for key in current if key not in wanted]
+    changed = [
+        key
+        for key, value in wanted.items()
+        if key in current and current[key][1] != value
+    ]
+    added = [key for key in wanted if key not in current]
+    ProductParameter.objects.filter(
+        id__in=[current[key][0] for key in dropped]
+    ).delete()
+    ProductParameter.objects.bulk_update(
+        [ProductParameter(id=current[key][0], value=wanted[key]) for key in changed],
+        ["value"],
+    )
+    ProductParameter.objects.bulk_create(
+        [
+            ProductParameter(
+                product_info_id=product_info_id,
+                parameter_id=parameter_id,
+                value=wanted[(product_info_id, parameter_id)],
+            )
+            for product_info_id, parameter_id in added
+        ]
+    )
+    for key in dropped + changed:
+        result.facet_deltas[(key[1], current[key][1])] -= 1
+    for key in changed + added:
+        result.facet_deltas[(key[1], wanted[key])] += 1
+
+
+def _import_goods(shop, goods, parameters, seen, result):
+    goods = {item["id"]: item for item in goods}
+    result.rows += len(goods)
+    seen.update(goods)
+    existing = {
+        external_id: (pk, digest, product_id)
+        for pk, external_id, digest, product_id in ProductInfo.objects.filter(
+            shop_id=shop.id, external_id__in=goods.keys()
+        ).values_list("id", "external_id", "content_hash", "product_id")
+    }
+    hashes = {}
+    for external_id, item in goods.items():
+        digest = content_hash(item)
+        if external_id in existing and existing[external_id][1] == digest:
+            result.unchanged += 1
+        else:
+            hashes[external_id] = digest
+    if not hashes:
+        return
+
+    changed = [goods[external_id] for external_id in hashes]
+    products = _resolve_products(changed, result)
+    _resolve_parameters(changed, parameters)
+
+    product_infos = [
+        ProductInfo(
+            id=existing.get(item["id"], (None,))[0],
+            product_id=products[(item["name"], item["category"])],
+            external_id=item["id"],
+            model=item["model"],
+            price=item["price"],
+            price_rrc=item["price_rrc"],
+            quantity=item["quantity"],
+            shop_id=shop.id,
+            content_hash=hashes[item["id"]],
+        )
+        for item in changed
+    ]
+    created = [product_info.pk is None for product_info in product_infos]
+    ProductInfo.objects.bulk_create(
+        [product_info for product_info in product_infos if product_info.pk is None]
+    )
+    ProductInfo.objects.bulk_update(
+        [
+            product_info
+            for product_info, is_new in zip(product_infos, created)
+            if not is_new
+        ],
+        ["product", "model", "price", "price_rrc", "quantity", "content_hash"],
+    )
+    result.touched_products.update(
+        product_info.product_id for product_info in product_infos
+    )
+    result.touched_products.update(
+        existing[item["id"]][2] for item in changed if item["id"] in existing
+    )
+    inserted = sum(created)
+    result.inserted += inserted
+    result.updated += len(created) - inserted
+    _sync_parameters(changed, product_infos, parameters, created, result)
+
+
+def _remove_missing(shop, seen, batch_size, result):
+    """Take offers missing from the price list off sale.
+
+    Offers that placed orders refer to are kept with no stock, so order
+    history stays intact, and get an empty content hash so they are
+    updated again if the good comes back. All other offers are deleted.
+    """
+    missing = []
+    for pk, external_id, product_id, quantity, digest in (
+        ProductInfo.objects.filter(shop_id=shop.id)
+        .values_list("id", "external_id", "product_id", "quantity", "content_hash")
+        .iterator(chunk_size=batch_size)
+    ):
+        if external_id not in seen and (quantity or digest):
+            missing.append(pk)
+            result.touched_products.add(product_id)
+    for start in range(0, len(missing), batch_size):
+        chunk = missing[start : start + batch_size]
+        ordered = set(
+            OrderItem.objects.filter(product_info_id__in=chunk)
+            .exclude(order__state="basket")
+            .values_list("product_info_id", flat=True)
+        )
+        unused = [pk for pk in chunk if pk not in ordered]
+        for parameter_id, value, offers in (
+            ProductParameter.objects.filter(product_info_id__in=unused)
+            .values_list("parameter_id", "value")
+            .annotate(offers=Count("id"))
+            .order_by()
+        ):
+            result.facet_deltas[(parameter_id, value)] -= offers
+        ProductInfo.objects.filter(id__in=ordered).update(quantity=0, content_hash="")
+        ProductInfo.objects.filter(id__in=unused).delete()
+    result.removed += len(missing)
+
+
+def import_price_list(shop, entries, batch_size=None, progress=None):
+    """Synchronise the catalog of ``shop`` with a price list.
+
+    ``entries`` is an iterable of ``(section, value)`` pairs as produced by
+    :func:`backend.price_list.iter_price_list`. Offers are matched on
+    ``(shop, external_id)``: goods whose content hash did not change are
+    skipped, changed goods are updated in place, new goods are inserted and
+    offers missing from the price list are removed.
+
+    Categories and goods are consumed in batches of ``batch_size`` rows, so
+    both memory and the number of queries grow with the number of batches
+    rather than with the number of goods and parameters. The whole import
+    runs in one transaction, which first locks the shop row so imports of
+    the same shop run one after another. ``progress`` is called with the
+    running result after every batch of goods.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    result = ImportResult()
+    parameters = {}
+    seen = set()
+    batch = {"categories": [], "goods": []}
+
+    def flush():
+        if batch["categories"]:
+            _import_categories(shop, batch["categories"], result)
+            batch["categories"] = []
+        if batch["goods"]:
+            _import_goods(shop, batch["goods"], parameters, seen, result)
+            batch["goods"] = []
+            if progress:
+                progress(result)
+
+    with transaction.atomic():
+        list(Shop.objects.select_for_update().filter(id=shop.id).values_list("id"))
+        for section, value in entries:
+            if section in batch:
+                batch[section].append(value)
+                if len(batch[section]) >= batch_size:
+                    flush()
+        flush()
+        _remove_missing(shop, seen, batch_size, result)
+        apply_facet_deltas(result.facet_deltas, batch_size)
+        refresh_best_offers(result.touched_products, batch_size)
+        bump_catalog_version_on_commit()
+    return result
@@ -0,0 +1,147 @@
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused, SMTPResponseException
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from backend.catalog_cache import catalog_cache
+from backend.models import QueuedEmail
+
+WAKEUP_KEY = "mail:wakeup"
+
+
+def queue_mail(subject, body, recipients, from_email=None):
+    """Store a message for :func:`deliver_queued_mail` and wake the sender.
+
+    A burst of messages wakes a single sender: the wakeup is skipped while
+    one is already pending, and the beat schedule drains whatever is left.
+    The pending flag lives in the catalog cache, which all web and worker
+    processes share.
+    """
+    from backend.tasks import send_queued_mail
+
+    email = QueuedEmail.objects.create(
+        subject=subject,
+        body=body,
+        recipients=list(recipients),
+        from_email=from_email or settings.EMAIL_HOST_USER or "",
+    )
+    if catalog_cache().add(WAKEUP_KEY, 1, settings.EMAIL_WAKEUP_TIMEOUT):
+        transaction.on_commit(send_queued_mail.delay)
+    return email
+
+
+def clear_wakeup():
+    """Let the next queued message wake a sender again."""
+    catalog_cache().delete(WAKEUP_KEY)
+
+
+def _claim(batch_size):
+    """Lease up to ``batch_size`` due messages to this sender.
+
+    Claimed messages are marked ``sending`` and ``next_attempt_at`` becomes
+    the end of the lease, in a transaction of its own. A message whose
+    lease ran out, because its sender died mid-batch, is due again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = QueuedEmail.objects.filter(
+            state__in=["queued", "sending"], next_attempt_at__lte=now
+        ).order_by("next_attempt_at", "id")
+        if db_connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        batch = list(queryset[:batch_size])
+        QueuedEmail.objects.filter(id__in=[email.id for email in batch]).update(
+            state="sending",
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_LEASE_TIMEOUT),
+        )
+    return batch
+
+
+def _failed(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        email.state = "failed"
+    else:
+        backoff = settings.EMAIL_RETRY_BACKOFF * 2 ** (email.attempts - 1)
+        email.state = "queued"
+        email.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+
+
+def deliver_queued_mail(batch_size=None, rate_limit=None, connection=None):
+    """Send one batch of queued messages over one SMTP connection.
+
+    A ``connection`` passed in is opened if needed and left open, so a
+    caller draining the queue reuses it for every batch.
+
+    Messages are claimed in a short transaction and sent outside of it;
+    each one is marked ``sent`` or rescheduled as soon as the server has
+    answered, so a crashed sender re-sends at most the message in flight.
+
+    At most ``rate_limit`` messages per second are sent. A message refused
+    by the server is rescheduled with exponential backoff and given up after
+    ``EMAIL_MAX_ATTEMPTS``; a dropped connection stops the batch, returns
+    the rest to the queue and is raised to the caller. Returns the number
+    of messages handled, 0 once nothing is due.
+    """
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    rate_limit = settings.EMAIL_RATE_LIMIT if rate_limit is None else rate_limit
+    interval = 1 / rate_limit if rate_limit else 0
+    owned = connection is None
+    connection = connection or get_connection(fail_silently=False)
+
+    batch = _claim(batch_size)
+    if not batch:
+        return 0
+    done = 0
+    error = None
+    try:
+        connection.open()
+        next_send = monotonic()
+        for email in batch:
+            if interval:
+                sleep(max(0, next_send - monotonic()))
+                next_send = monotonic() + interval
+            try:
+                connection.send_messages([_message(email, connection)])
+            except (SMTPRecipientsRefused, SMTPResponseException) as refused:
+                _failed(email, refused)
+            else:
+                email.state = "sent"
+                email.sent_at = timezone.now()
+            email.save(
+                update_fields=[
+                    "state",
+                    "attempts",
+                    "next_attempt_at",
+                    "last_error",
+                    "sent_at",
+                ]
+            )
+            done += 1
+    except OSError as dropped:
+        error = dropped
+    finally:
+        if owned or error:
+            connection.close()
+        # whatever was not sent goes back to the queue right away
+        QueuedEmail.objects.filter(
+            id__in=[email.id for email in batch[done:]], state="sending"
+        ).update(state="queued", next_attempt_at=timezone.now())
+    if error:
+        raise error
+    return done
+
+
+def _message(email, connection):
+    return EmailMessage(
+        email.subject,
+        email.body,
+        email.from_email,
+        email.recipients,
+        connection=connection,
+    )
@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from backend.checkout import OutOfStock, checkout
+from backend.models import Order, OrderItem, ProductInfo, Shop, User
+
+
+def place_orders(product_info, buyers, threads, quantity=1, retries=20):
+    """Check out one basket per buyer from ``threads`` threads at once.
+
+    Every basket holds ``quantity`` units of ``product_info``. Returns the
+    number of successful checkouts and of checkouts rejected for lack of
+    stock. Checkouts failing on a busy database are retried.
+    """
+    orders = []
+    for buyer in buyers:
+        order = Order.objects.create(user=buyer, state="basket")
+        OrderItem.objects.create(
+            order=order, product_info=product_info, quantity=quantity
+        )
+        orders.append(order)
+
+    def place(order):
+        try:
+            for attempt in range(retries):
+                try:
+                    checkout(order)
+                    return True
+                except OutOfStock:
+                    return False
+                except OperationalError:
+                    if attempt == retries - 1:
+                        raise
+                    sleep(min(0.01 * 2**attempt, 0.5))
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(place, orders))
+    return results.count(True), results.count(False)
+
+
+class Command(BaseCommand):
+    help = "Hammer one offer with concurrent checkouts and report throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=1000)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--stock", type=int, default=500)
+
+    def handle(self, *args, **options):
+        shop = Shop.objects.create(name="Checkout benchmark")
+        product_info = ProductInfo.objects.create(
+            shop=shop, external_id=0, quantity=options["stock"], price=1, price_rrc=1
+        )
+        buyers = User.objects.bulk_create(
+            User(email=f"buyer{pk}@example.com", username=f"checkout-buyer-{pk}")
+            for pk in range(options["orders"])
+        )
+        try:
+            started = perf_counter()
+            placed, rejected = place_orders(product_info, buyers, options["threads"])
+            elapsed = perf_counter() - started
+            product_info.refresh_from_db()
+            self.stdout.write(
+                f"orders: {options['orders']}, threads: {options['threads']}, "
+                f"placed: {placed}, out of stock: {rejected}, "
+                f"stock left: {product_info.quantity}, "
+                f"time: {elapsed:.2f}s, checkouts/s: {options['orders'] / elapsed:.0f}"
+            )
+        finally:
+            User.objects.filter(id__in=[buyer.id for buyer in buyers]).delete()
+            shop.delete()
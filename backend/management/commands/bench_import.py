@@ -0,0 +1,83 @@
+from tempfile import TemporaryFile
+from time import perf_counter
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from yaml import safe_dump
+
+from backend.importer import import_price_list
+from backend.models import Shop
+from backend.price_list import iter_price_list
+
+
+def generate_price_list(items, parameters=10, categories=20):
+    yield "shop", "Benchmark"
+    for pk in range(categories):
+        yield "categories", {"id": 900000 + pk, "name": f"Категория {pk}"}
+    for pk in range(items):
+        yield "goods", {
+            "id": pk,
+            "category": 900000 + pk % categories,
+            "model": f"model/{pk % 1000}",
+            "name": f"Товар {pk}",
+            "price": 1000 + pk % 5000,
+            "price_rrc": 1200 + pk % 5000,
+            "quantity": pk % 50,
+            "parameters": {
+                f"Параметр {number}": f"значение {pk % (number + 2)}"
+                for number in range(parameters)
+            },
+        }
+
+
+def write_price_list(stream, entries):
+    section = None
+    for key, value in entries:
+        if key == section:
+            pass
+        elif key in ("categories", "goods"):
+            section = key
+            stream.write(f"{key}:\n".encode())
+        else:
+            section = None
+            stream.write(safe_dump({key: value}, allow_unicode=True).encode())
+            continue
+        stream.write(safe_dump([value], allow_unicode=True).encode())
+
+
+class Command(BaseCommand):
+    help = "Benchmark the price list importer on a generated file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100000)
+        parser.add_argument("--parameters", type=int, default=10)
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument(
+            "--keep", action="store_true", help="Commit the imported rows"
+        )
+
+    def handle(self, *args, **options):
+        with TemporaryFile() as stream:
+            write_price_list(
+                stream, generate_price_list(options["items"], options["parameters"])
+            )
+            self.stdout.write(f"file size: {stream.tell() / 2 ** 20:.1f} MiB")
+            with transaction.atomic():
+                shop = Shop.objects.create(name=f"Benchmark {uuid4().hex[:8]}")
+                for run in ("initial", "unchanged"):
+                    stream.seek(0)
+                    with CaptureQueriesContext(connection) as queries:
+                        started = perf_counter()
+                        result = import_price_list(
+                            shop, iter_price_list(stream), options["batch_size"]
+                        )
+                        elapsed = perf_counter() - started
+                    self.stdout.write(
+                        f"{run}: rows: {result.rows}, inserted: {result.inserted}, "
+                        f"unchanged: {result.unchanged}, queries: {len(queries)}, "
+                        f"time: {elapsed:.2f}s, rows/s: {result.rows / elapsed:.0f}"
+                    )
+                if not options["keep"]:
+                    transaction.set_rollback(True)
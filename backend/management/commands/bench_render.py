@@ -0,0 +1,43 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from backend.importer import import_price_list
+from backend.management.commands.bench_import import generate_price_list
+from backend.models import Shop
+from backend.renderers import JSON_BACKENDS, FastJSONRenderer
+from backend.serializers import ShopSerializer
+from backend.views import shop_queryset
+
+
+class Command(BaseCommand):
+    help = "Benchmark JSON renderers on a large nested shop listing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            shop = Shop.objects.create(name="Benchmark")
+            import_price_list(shop, generate_price_list(options["items"]))
+            data = ShopSerializer(shop_queryset().filter(id=shop.id), many=True).data
+            transaction.set_rollback(True)
+
+        renderers = {"stock JSONRenderer": JSONRenderer()}
+        for name in JSON_BACKENDS:
+            renderer = FastJSONRenderer()
+            renderer.backend = name
+            renderers[f"FastJSONRenderer ({name})"] = renderer
+
+        for name, renderer in renderers.items():
+            size = len(renderer.render(data))
+            started = perf_counter()
+            for _ in range(options["repeat"]):
+                renderer.render(data)
+            elapsed = (perf_counter() - started) / options["repeat"] * 1000
+            self.stdout.write(
+                f"{name}: {elapsed:.1f}ms per render, {size / 2 ** 20:.1f} MiB"
+            )
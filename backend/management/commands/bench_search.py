@@ -0,0 +1,61 @@
+import random
+from statistics import quantiles
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.models import Product
+from backend.search import get_search_backend, search_products
+
+WORDS = (
+    "смартфон планшет ноутбук чехол кабель зарядка наушники колонка apple "
+    "samsung xiaomi iphone galaxy redmi pro max mini 64gb 128gb 256gb 512gb "
+    "черный белый красный синий золотистый"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Benchmark product search latency on a generated catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        generator = random.Random(options["seed"])
+        backend = get_search_backend()
+        self.stdout.write(f"backend: {type(backend).__name__}")
+        with transaction.atomic():
+            missing = options["products"] - Product.objects.count()
+            for start in range(0, max(missing, 0), 10000):
+                Product.objects.bulk_create(
+                    Product(name=" ".join(generator.sample(WORDS, 4)))
+                    for _ in range(min(10000, missing - start))
+                )
+
+            started = perf_counter()
+            list(
+                search_products(WORDS[0], Product.objects.all())[: options["page_size"]]
+            )
+            self.stdout.write(f"warm-up: {perf_counter() - started:.2f}s")
+
+            timings = []
+            for _ in range(options["queries"]):
+                query = " ".join(generator.sample(WORDS, generator.randint(1, 3)))
+                started = perf_counter()
+                list(
+                    search_products(query, Product.objects.all())[
+                        : options["page_size"]
+                    ]
+                )
+                timings.append((perf_counter() - started) * 1000)
+            percentiles = quantiles(timings, n=100)
+            self.stdout.write(
+                f"products: {Product.objects.count()}, queries: {len(timings)}, "
+                f"p50: {percentiles[49]:.1f}ms, p95: {percentiles[94]:.1f}ms, "
+                f"max: {max(timings):.1f}ms"
+            )
+            transaction.set_rollback(True)
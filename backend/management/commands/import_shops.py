@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+import hashlib
+import os
+from time import perf_counter
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from backend.price_list import iter_price_list
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as stream:
+        for chunk in iter(lambda: stream.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def init_worker():
+    """Prepare a pool process for ORM work.
+
+    Processes started with ``spawn`` or ``forkserver`` have not set Django
+    up yet, forked ones share the parent's database connections.
+    """
+    django.setup()
+    connections.close_all()
+
+
+def import_file(path, force=False):
+    # imported here, this module is loaded by pool processes before setup
+    from backend.importer import import_price_list
+    from backend.models import Shop
+
+    digest = file_hash(path)
+    with open(path, "rb") as stream:
+        entries = iter_price_list(stream)
+        section, name = next(entries, (None, None))
+        if section != "shop":
+            raise ValueError(f"{path}: the shop name must be the first key")
+        shop, _ = Shop.objects.get_or_create(name=name)
+        if shop.source_hash == digest and not force:
+            return name, None, 0
+        started = perf_counter()
+        result = import_price_list(shop, entries)
+        elapsed = perf_counter() - started
+    shop.source_hash = digest
+    shop.save(update_fields=["source_hash"])
+    return name, result, elapsed
+
+
+def _collect(patterns):
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for extension in ("yaml", "yml"):
+                paths.update(glob(os.path.join(pattern, f"*.{extension}")))
+        else:
+            paths.update(glob(pattern))
+    return sorted(paths)
+
+
+class Command(BaseCommand):
+    help = "Import shop price lists from YAML files in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Directories or glob patterns")
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument(
+            "--force", action="store_true", help="Import unchanged files as well"
+        )
+
+    def report(self, path, outcome):
+        name, result, elapsed = outcome
+        if result is None:
+            self.stdout.write(f"{path}: {name} not changed, skipped")
+            return
+        rows_per_second = result.rows / elapsed if elapsed else result.rows
+        self.stdout.write(
+            f"{path}: {name} rows: {result.rows}, inserted: {result.inserted}, "
+            f"updated: {result.updated}, unchanged: {result.unchanged}, "
+            f"removed: {result.removed}, time: {elapsed:.2f}s, "
+            f"rows/s: {rows_per_second:.0f}"
+        )
+
+    def handle(self, *args, **options):
+        paths = _collect(options["paths"])
+        if not paths:
+            raise CommandError("No price list files found")
+
+        failed = 0
+        if options["workers"] <= 1:
+            for path in paths:
+                try:
+                    self.report(path, import_file(path, options["force"]))
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f"{path}: {error}")
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(
+                options["workers"], initializer=init_worker
+            ) as executor:
+                futures = {
+                    executor.submit(import_file, path, options["force"]): path
+                    for path in paths
+                }
+                for future in as_completed(futures):
+                    try:
+                        self.report(futures[future], future.result())
+                    except Exception as error:
+                        failed += 1
+                        self.stderr.write(f"{futures[future]}: {error}")
+        if failed:
+            raise CommandError(f"{failed} of {len(paths)} files failed")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.catalog_cache import bump_catalog_version_on_commit
+from backend.models import BestOffer
+from backend.offers import rebuild_best_offers
+
+
+class Command(BaseCommand):
+    help = "Recompute the best offer of every product"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_best_offers()
+            bump_catalog_version_on_commit()
+        self.stdout.write(f"best offers: {BestOffer.objects.count()}")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.catalog_cache import bump_catalog_version_on_commit
+from backend.facets import rebuild_facet_counts
+from backend.models import FacetCount
+
+
+class Command(BaseCommand):
+    help = "Recount the offers of every facet value"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_facet_counts()
+            bump_catalog_version_on_commit()
+        self.stdout.write(f"facet values: {FacetCount.objects.count()}")
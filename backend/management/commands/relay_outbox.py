@@ -0,0 +1,30 @@
+from time import sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.outbox import purge_outbox, relay_outbox
+
+
+class Command(BaseCommand):
+    help = "Publish pending outbox events to the broker"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new events"
+        )
+        parser.add_argument(
+            "--interval", type=float, default=None, help="Seconds between polls"
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"] or settings.OUTBOX_RELAY_INTERVAL
+        while True:
+            published = relay_outbox()
+            if published:
+                self.stdout.write(f"published: {published}")
+            elif not options["loop"]:
+                break
+            else:
+                purge_outbox()
+                sleep(interval)
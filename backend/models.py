@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.base_user import BaseUserManager
@@ -17,6 +18,21 @@ STATE_CHOICES = (
     ("canceled", "Отменен"),
 )
 
+IMPORT_STATE_CHOICES = (
+    ("pending", "В очереди"),
+    ("running", "Выполняется"),
+    ("done", "Завершен"),
+    ("skipped", "Не изменен"),
+    ("failed", "Ошибка"),
+)
+
+EMAIL_STATE_CHOICES = (
+    ("queued", "В очереди"),
+    ("sending", "Отправляется"),
+    ("sent", "Отправлено"),
+    ("failed", "Ошибка"),
+)
+
 USER_TYPE_CHOICES = (
     ("shop", "Магазин"),
     ("buyer", "Покупатель"),
@@ -88,6 +104,12 @@ class User(AbstractUser):
     avatar_thumbnail = ThumbnailerImageField(
         upload_to="avatars/", blank=True, null=True
     )
+    avatar_hash = models.CharField(
+        max_length=64, verbose_name="Хэш аватара", blank=True, db_index=True
+    )
+    avatar_thumbnails = models.JSONField(
+        verbose_name="Миниатюры аватара", default=dict, blank=True
+    )
 
     class Meta:
         verbose_name = "Пользователь"
@@ -99,9 +121,18 @@ class User(AbstractUser):
 
 
 class Shop(models.Model):
-    name = models.CharField(max_length=50, verbose_name="Название магазина")
+    name = models.CharField(
+        max_length=50, verbose_name="Название магазина", unique=True
+    )
     url = models.URLField(verbose_name="Ссылка", null=True, blank=True)
     filename = models.FileField()
+    etag = models.CharField(max_length=255, verbose_name="ETag прайс-листа", blank=True)
+    last_modified = models.CharField(
+        max_length=64, verbose_name="Дата изменения прайс-листа", blank=True
+    )
+    source_hash = models.CharField(
+        max_length=64, verbose_name="Хэш файла прайс-листа", blank=True
+    )
 
     user = models.OneToOneField(
         User,
@@ -122,6 +153,50 @@ class Shop(models.Model):
         return self.name
 
 
+class ImportJob(models.Model):
+    shop = models.ForeignKey(
+        Shop,
+        verbose_name="Магазин",
+        related_name="import_jobs",
+        on_delete=models.CASCADE,
+    )
+    url = models.URLField(verbose_name="Ссылка")
+    task_id = models.CharField(max_length=50, blank=True)
+    state = models.CharField(
+        max_length=10,
+        verbose_name="Статус",
+        choices=IMPORT_STATE_CHOICES,
+        default="pending",
+    )
+    rows_processed = models.PositiveIntegerField(
+        verbose_name="Обработано строк", default=0
+    )
+    inserted = models.PositiveIntegerField(verbose_name="Добавлено", default=0)
+    updated = models.PositiveIntegerField(verbose_name="Обновлено", default=0)
+    unchanged = models.PositiveIntegerField(verbose_name="Без изменений", default=0)
+    removed = models.PositiveIntegerField(verbose_name="Удалено", default=0)
+    errors = models.JSONField(verbose_name="Ошибки", default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Загрузка прайс-листа"
+        verbose_name_plural = "Загрузки прайс-листов"
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"{self.shop} {self.created_at}"
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0
+        finished_at = self.finished_at or timezone.now()
+        elapsed = (finished_at - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0
+
+
 class Category(models.Model):
     name = models.CharField(max_length=50, verbose_name="Название категории")
     shops = models.ManyToManyField(
@@ -154,6 +229,11 @@ class Product(models.Model):
         verbose_name = "Продукт"
         verbose_name_plural = "Продукты"
         ordering = ("-name",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "category"], name="unique_product"
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -181,6 +261,9 @@ class ProductInfo(models.Model):
     quantity = models.PositiveIntegerField(verbose_name="Количество")
     price = models.PositiveIntegerField(verbose_name="Цена")
     price_rrc = models.PositiveIntegerField(verbose_name="Рекомендуемая розничная цена")
+    content_hash = models.CharField(
+        max_length=32, verbose_name="Хэш содержимого", blank=True
+    )
 
     class Meta:
         verbose_name = "Информация о продукте"
@@ -188,12 +271,17 @@ class ProductInfo(models.Model):
         constraints = [
             models.UniqueConstraint(
                 fields=["product", "shop", "external_id"], name="unique_product_info"
-            )
+            ),
+            models.UniqueConstraint(
+                fields=["shop", "external_id"], name="unique_shop_external_id"
+            ),
         ]
 
 
 class Parameter(models.Model):
-    name = models.CharField(max_length=50, verbose_name="Название параметра")
+    name = models.CharField(
+        max_length=50, verbose_name="Название параметра", unique=True
+    )
 
     class Meta:
         verbose_name = "Параметр"
@@ -229,6 +317,56 @@ class ProductParameter(models.Model):
                 fields=["product_info", "parameter"], name="unique_product_parameter"
             )
         ]
+        indexes = [models.Index(fields=["parameter", "value"])]
+
+
+class FacetCount(models.Model):
+    parameter = models.ForeignKey(
+        Parameter,
+        verbose_name="Параметр",
+        related_name="facet_counts",
+        on_delete=models.CASCADE,
+    )
+    value = models.CharField(max_length=100, verbose_name="Значение")
+    offers = models.PositiveIntegerField(verbose_name="Количество предложений")
+
+    class Meta:
+        verbose_name = "Счетчик фасета"
+        verbose_name_plural = "Счетчики фасетов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["parameter", "value"], name="unique_facet_count"
+            )
+        ]
+
+
+class BestOffer(models.Model):
+    product = models.OneToOneField(
+        Product,
+        verbose_name="Продукт",
+        related_name="best_offer",
+        primary_key=True,
+        on_delete=models.CASCADE,
+    )
+    product_info = models.ForeignKey(
+        ProductInfo,
+        verbose_name="Информация о продукте",
+        related_name="+",
+        on_delete=models.CASCADE,
+    )
+    shop = models.ForeignKey(
+        Shop,
+        verbose_name="Магазин",
+        related_name="best_offers",
+        on_delete=models.CASCADE,
+    )
+    price = models.PositiveIntegerField(verbose_name="Цена")
+    quantity = models.PositiveIntegerField(verbose_name="Количество")
+    offers = models.PositiveIntegerField(verbose_name="Количество предложений")
+
+    class Meta:
+        verbose_name = "Лучшее предложение"
+        verbose_name_plural = "Лучшие предложения"
 
 
 class Contact(models.Model):
@@ -265,6 +403,7 @@ class Order(models.Model):
         on_delete=models.CASCADE,
     )
     dt = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменен")
     state = models.CharField(
         max_length=20, verbose_name="Статус", choices=STATE_CHOICES
     )
@@ -276,6 +415,10 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ("-dt",)
+        indexes = [
+            models.Index(fields=["user", "-id"]),
+            models.Index(fields=["updated_at", "id"]),
+        ]
 
     def __str__(self):
         return str(self.dt)
@@ -308,6 +451,43 @@ class OrderItem(models.Model):
         ]
 
 
+class QueuedEmail(models.Model):
+    subject = models.CharField(max_length=255, verbose_name="Тема")
+    body = models.TextField(verbose_name="Текст")
+    from_email = models.CharField(
+        max_length=255, verbose_name="Отправитель", blank=True
+    )
+    recipients = models.JSONField(verbose_name="Получатели", default=list)
+    state = models.CharField(
+        max_length=10,
+        verbose_name="Статус",
+        choices=EMAIL_STATE_CHOICES,
+        default="queued",
+    )
+    attempts = models.PositiveSmallIntegerField(verbose_name="Попытки", default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(verbose_name="Ошибка", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Письмо в очереди"
+        verbose_name_plural = "Очередь писем"
+        indexes = [models.Index(fields=["state", "next_attempt_at"])]
+
+
+class OutboxEvent(models.Model):
+    event = models.CharField(max_length=50, verbose_name="Событие")
+    payload = models.JSONField(verbose_name="Данные", default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Событие в очереди публикации"
+        verbose_name_plural = "Очередь публикации событий"
+        indexes = [models.Index(fields=["published_at", "id"])]
+
+
 class ConfirmEmailToken(models.Model):
     class Meta:
         verbose_name = "Токен подтверждение Email"
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+from backend.models import BestOffer, Product, ProductInfo
+
+
+def _lock_products(product_ids):
+    """Lock the ``Product`` rows whose best offers are about to be recomputed.
+
+    Concurrent imports sharing a product wait for each other here, so the
+    second one reads the offers the first has committed. ``NO KEY UPDATE``
+    does not conflict with the key share locks taken by inserting offers.
+    """
+    list(
+        Product.objects.filter(id__in=product_ids)
+        .order_by("id")
+        .select_for_update(no_key=connection.features.has_select_for_no_key_update)
+        .values_list("id", flat=True)
+    )
+
+
+def _refresh_chunk(chunk):
+    best = {}
+    for product_info in (
+        ProductInfo.objects.filter(
+            product_id__in=chunk, quantity__gt=0, shop__state=True
+        )
+        .order_by("product_id", "price", "id")
+        .values_list("id", "product_id", "shop_id", "price", "quantity")
+    ):
+        pk, product_id, shop_id, price, quantity = product_info
+        if product_id in best:
+            best[product_id].offers += 1
+        else:
+            best[product_id] = BestOffer(
+                product_id=product_id,
+                product_info_id=pk,
+                shop_id=shop_id,
+                price=price,
+                quantity=quantity,
+                offers=1,
+            )
+    BestOffer.objects.filter(product_id__in=chunk).exclude(
+        product_id__in=list(best)
+    ).delete()
+    BestOffer.objects.bulk_create(
+        best.values(),
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["product_info", "shop", "price", "quantity", "offers"],
+    )
+
+
+def refresh_best_offers(product_ids, batch_size=None):
+    """Recompute the cheapest in-stock offer of the given products.
+
+    Only offers with a positive quantity from enabled shops are considered;
+    products left without such offers lose their row. Rows are upserted
+    under a lock on their products, so imports running in parallel neither
+    clash on the primary key nor overwrite each other with a stale result.
+    """
+    product_ids = sorted(set(product_ids) - {None})
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start : start + batch_size]
+        with transaction.atomic():
+            _lock_products(chunk)
+            _refresh_chunk(chunk)
+
+
+def rebuild_best_offers(batch_size=None):
+    product_ids = set(BestOffer.objects.values_list("product_id", flat=True))
+    product_ids.update(
+        ProductInfo.objects.values_list("product_id", flat=True).distinct()
+    )
+    refresh_best_offers(product_ids, batch_size)
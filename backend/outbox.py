@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend.models import OutboxEvent
+
+
+def publish_event(event, **payload):
+    """Record ``event`` in the outbox as part of the current transaction.
+
+    Nothing is sent to the broker here: :func:`relay_outbox` publishes the
+    event once the transaction that wrote it has committed, and a rolled
+    back transaction takes the event with it.
+    """
+    if event not in get_handlers():
+        raise ValueError(f"Unknown event {event}")
+    return OutboxEvent.objects.create(event=event, payload=payload)
+
+
+def get_handlers():
+    from backend import tasks
+
+    return {
+        "user.registered": tasks.new_user_registered,
+        "user.email_confirmed": tasks.user_email_confirmed,
+        "user.avatar_changed": tasks.process_user_avatar,
+        "order.created": tasks.new_order,
+        "orders.state_changed": tasks.orders_state_changed,
+    }
+
+
+def relay_outbox(batch_size=None):
+    """Publish one batch of pending events as Celery tasks.
+
+    Events are handed to the broker in id order and marked published
+    afterwards, so a crash in between publishes them again: delivery is at
+    least once. A broker error stops the batch and leaves the remaining
+    events pending. Returns the number of events published.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    handlers = get_handlers()
+    with transaction.atomic():
+        pending = OutboxEvent.objects.filter(published_at=None).order_by("id")
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        published = []
+        error = None
+        for event in pending[:batch_size]:
+            try:
+                handlers[event.event].apply_async(kwargs=event.payload)
+            except Exception as broker_error:
+                error = broker_error
+                break
+            event.published_at = timezone.now()
+            published.append(event)
+        OutboxEvent.objects.bulk_update(published, ["published_at"])
+    if error:
+        raise error
+    return len(published)
+
+
+def purge_outbox(retention=None):
+    retention = retention or settings.OUTBOX_RETENTION
+    OutboxEvent.objects.filter(
+        published_at__lt=timezone.now() - timedelta(seconds=retention)
+    ).delete()
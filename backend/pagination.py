@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination over the primary key.
+
+    Pages are fetched with ``WHERE id > <cursor> LIMIT <size>`` so their cost
+    does not depend on how deep the client has scrolled and no ``COUNT(*)``
+    is run. Clients that need totals can still pass ``?page=`` to get the
+    usual page number pagination with ``count``.
+    """
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number_paginator = None
+        if PageNumberPagination.page_query_param in request.query_params:
+            self.page_number_paginator = PageNumberPagination()
+            return self.page_number_paginator.paginate_queryset(
+                queryset.order_by(self.ordering), request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecentFirstPagination(KeysetPagination):
+    ordering = "-id"
+
+
+class ProductKeyPagination(KeysetPagination):
+    ordering = "pk"
+
+
+def encode_since(updated_at, pk):
+    """Cursor pointing right after a row changed at ``updated_at``."""
+    return f"{(updated_at - EPOCH) // timedelta(microseconds=1)}.{pk}"
+
+
+def decode_since(value):
+    try:
+        microseconds, pk = (int(part) for part in value.split("."))
+        return EPOCH + timedelta(microseconds=microseconds), pk
+    except (ValueError, OverflowError):
+        raise ValidationError({"since": "Неверный курсор"})
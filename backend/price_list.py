@@ -0,0 +1,102 @@
+from yaml import (
+    AliasEvent,
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingNode,
+    MappingStartEvent,
+    ScalarEvent,
+    ScalarNode,
+    SequenceEndEvent,
+    SequenceNode,
+    SequenceStartEvent,
+)
+from yaml.composer import ComposerError
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+STREAMED_SECTIONS = ("categories", "goods")
+
+
+def _resolve_tag(loader, kind, event, value=None):
+    if event.tag is not None and event.tag != "!":
+        return event.tag
+    return loader.resolve(kind, value, event.implicit)
+
+
+def _compose(loader):
+    event = loader.get_event()
+    if isinstance(event, ScalarEvent):
+        tag = _resolve_tag(loader, ScalarNode, event, event.value)
+        return ScalarNode(
+            tag, event.value, event.start_mark, event.end_mark, style=event.style
+        )
+    if isinstance(event, SequenceStartEvent):
+        node = SequenceNode(
+            _resolve_tag(loader, SequenceNode, event),
+            [],
+            event.start_mark,
+            None,
+            flow_style=event.flow_style,
+        )
+        while not loader.check_event(SequenceEndEvent):
+            node.value.append(_compose(loader))
+        node.end_mark = loader.get_event().end_mark
+        return node
+    if isinstance(event, MappingStartEvent):
+        node = MappingNode(
+            _resolve_tag(loader, MappingNode, event),
+            [],
+            event.start_mark,
+            None,
+            flow_style=event.flow_style,
+        )
+        while not loader.check_event(MappingEndEvent):
+            key = _compose(loader)
+            node.value.append((key, _compose(loader)))
+        node.end_mark = loader.get_event().end_mark
+        return node
+    if isinstance(event, AliasEvent):
+        raise ComposerError(
+            None, None, "aliases are not supported in price lists", event.start_mark
+        )
+    raise ComposerError(None, None, f"unexpected {event}", event.start_mark)
+
+
+def _construct(loader, node):
+    value = loader.construct_object(node, deep=True)
+    loader.constructed_objects = {}
+    loader.recursive_objects = {}
+    return value
+
+
+def iter_price_list(stream):
+    """Parse a YAML price list lazily, yielding ``(section, value)`` pairs.
+
+    Every entry of the ``categories`` and ``goods`` sequences is yielded on
+    its own as soon as it is parsed, other top-level keys (e.g. ``shop``)
+    are yielded with their whole value. Only one entry is held in memory at
+    a time, so the file may be arbitrarily large.
+    """
+    loader = SafeLoader(stream)
+    try:
+        loader.get_event()
+        if loader.check_event(DocumentStartEvent):
+            loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            raise ComposerError(None, None, "expected a mapping at the top level", None)
+        loader.get_event()
+        while not loader.check_event(MappingEndEvent):
+            section = _construct(loader, _compose(loader))
+            if section in STREAMED_SECTIONS and loader.check_event(SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(SequenceEndEvent):
+                    yield section, _construct(loader, _compose(loader))
+                loader.get_event()
+            else:
+                yield section, _construct(loader, _compose(loader))
+    finally:
+        loader.dispose()
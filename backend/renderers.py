@@ -0,0 +1,83 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _orjson_dumps(data, default):
+    return orjson.dumps(data, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _ujson_dumps(data, default):
+    return ujson.dumps(
+        data, ensure_ascii=False, escape_forward_slashes=False, default=default
+    ).encode()
+
+
+def _json_dumps(data, default):
+    return json.dumps(
+        data, ensure_ascii=False, separators=(",", ":"), default=default
+    ).encode()
+
+
+JSON_BACKENDS = {"json": (_json_dumps, json.loads)}
+if ujson is not None:
+    JSON_BACKENDS["ujson"] = (_ujson_dumps, ujson.loads)
+if orjson is not None:
+    JSON_BACKENDS["orjson"] = (_orjson_dumps, orjson.loads)
+
+
+def get_json_backend(name=None):
+    """Return ``(dumps, loads)`` of the first available backend.
+
+    ``name`` (or the ``JSON_BACKEND`` setting) picks a specific one; unknown
+    or uninstalled names fall back to the fastest installed library.
+    """
+    name = name or settings.JSON_BACKEND
+    if name in JSON_BACKENDS:
+        return JSON_BACKENDS[name]
+    for name in ("orjson", "ujson", "json"):
+        if name in JSON_BACKENDS:
+            return JSON_BACKENDS[name]
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` backed by orjson or ujson when installed.
+
+    Types the libraries do not know (lazy strings, decimals, querysets) go
+    through DRF's encoder. Indented output is left to the stock renderer.
+    """
+
+    backend = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        dumps, _ = get_json_backend(self.backend)
+        return dumps(data, JSONEncoder().default)
+
+
+class FastJSONParser(JSONParser):
+    backend = None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        _, loads = get_json_backend(self.backend)
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
@@ -0,0 +1,240 @@
+from bisect import bisect_left
+from collections import defaultdict
+import re
+from threading import RLock
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorField,
+    TrigramSimilarity,
+)
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import F, Func, Q, Value
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend.catalog_cache import get_catalog_version
+from backend.models import Product
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower().replace("ё", "е"))
+
+
+class RankedProducts:
+    """Lazily loaded products in the order of a ranked list of ids."""
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        ids = self.ids[index]
+        if not isinstance(index, slice):
+            return self.queryset.get(id=ids)
+        products = self.queryset.in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+
+class InvertedIndexSearch:
+    """In-process inverted index over product names.
+
+    Used where the database has no full text search (SQLite, tests). Every
+    query token must match a name token exactly or as a prefix; exact
+    matches rank higher than prefix matches.
+
+    The index lives in one process and is kept current by the signals of
+    that process only. Changes made elsewhere are caught by rebuilding it
+    from the database whenever the shared catalog version has moved since
+    it was built; products added in the meantime are picked up on the next
+    search by indexing ids above the highest one seen so far. Rebuilds read
+    the whole product table, which is fine for development and test data
+    but not for a production catalog, use :class:`PostgresSearch` there.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._postings = defaultdict(set)
+            self._documents = {}
+            self._vocabulary = []
+            self._dirty = False
+            self._last_id = 0
+            self._version = None
+
+    def index_products(self, products):
+        with self._lock:
+            for pk, name in products:
+                self._remove(pk)
+                tokens = frozenset(tokenize(name))
+                self._documents[pk] = tokens
+                for token in tokens:
+                    self._postings[token].add(pk)
+                self._last_id = max(self._last_id, pk)
+            self._dirty = True
+
+    def _remove(self, pk):
+        for token in self._documents.pop(pk, ()):
+            self._postings[token].discard(pk)
+            if not self._postings[token]:
+                del self._postings[token]
+                self._dirty = True
+
+    def remove_products(self, ids):
+        with self._lock:
+            for pk in ids:
+                self._remove(pk)
+
+    def _refresh(self):
+        self.index_products(
+            Product.objects.filter(id__gt=self._last_id)
+            .order_by("id")
+            .values_list("id", "name")
+            .iterator()
+        )
+
+    def _prefixed(self, token):
+        if self._dirty:
+            self._vocabulary = sorted(self._postings)
+            self._dirty = False
+        start = bisect_left(self._vocabulary, token)
+        for word in self._vocabulary[start:]:
+            if not word.startswith(token):
+                break
+            yield word
+
+    def rank(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            self._refresh()
+            scores = None
+            for token in set(tokens):
+                matches = defaultdict(int)
+                for word in self._prefixed(token):
+                    weight = 2 if word == token else 1
+                    for pk in self._postings[word]:
+                        matches[pk] = max(matches[pk], weight)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        pk: score + matches[pk]
+                        for pk, score in scores.items()
+                        if pk in matches
+                    }
+                if not scores:
+                    return []
+        return sorted(scores, key=lambda pk: (-scores[pk], pk))
+
+    def _sync(self):
+        version = get_catalog_version()
+        with self._lock:
+            if version != self._version:
+                self.clear()
+                self._version = version
+
+    def search(self, query, queryset):
+        self._sync()
+        return RankedProducts(self.rank(query), queryset)
+
+
+class PostgresSearch:
+    """Full text search with a trigram fallback for typos and partial words.
+
+    Relies on the GIN indexes created by :func:`create_search_indexes`.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def clear(self):
+        pass
+
+    def index_products(self, products):
+        pass
+
+    def remove_products(self, ids):
+        pass
+
+    def search(self, query, queryset):
+        search_query = SearchQuery(query, config=self.config, search_type="websearch")
+        document = Func(
+            Value(self.config),
+            F("name"),
+            function="to_tsvector",
+            output_field=SearchVectorField(),
+        )
+        return (
+            queryset.annotate(
+                document=document,
+                rank=SearchRank(document, search_query)
+                + TrigramSimilarity("name", query),
+            )
+            .filter(Q(document=search_query) | Q(name__trigram_similar=query))
+            .order_by("-rank", "id")
+        )
+
+
+SEARCH_INDEXES = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS backend_product_name_fts "
+    "ON backend_product USING gin (to_tsvector('{config}', name))",
+    "CREATE INDEX IF NOT EXISTS backend_product_name_trgm "
+    "ON backend_product USING gin (name gin_trgm_ops)",
+)
+
+
+def create_search_indexes(using=DEFAULT_DB_ALIAS, **kwargs):
+    search_connection = connections[using]
+    if search_connection.vendor != "postgresql":
+        return
+    with search_connection.cursor() as cursor:
+        for statement in SEARCH_INDEXES:
+            cursor.execute(statement.format(config=settings.SEARCH_CONFIG))
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        if connection.vendor == "postgresql":
+            _backend = PostgresSearch(settings.SEARCH_CONFIG)
+        else:
+            _backend = InvertedIndexSearch()
+    return _backend
+
+
+def search_products(query, queryset):
+    query = query.strip()
+    if not query:
+        return queryset.order_by("id")
+    return get_search_backend().search(query, queryset)
+
+
+def index_products_on_commit(products):
+    products = list(products)
+    transaction.on_commit(lambda: get_search_backend().index_products(products))
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, **kwargs):
+    index_products_on_commit([(instance.pk, instance.name)])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
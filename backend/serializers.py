@@ -1,8 +1,11 @@
 from rest_framework import serializers
 
+from backend.dictionaries import category_names, parameter_names
+
 from backend.models import (
     User,
     Shop,
+    ImportJob,
     Product,
     Category,
     ProductInfo,
@@ -11,9 +14,83 @@ from backend.models import (
     Contact,
     Order,
     OrderItem,
+    BestOffer,
 )
 
 
+class DictionaryNameField(serializers.ReadOnlyField):
+    """Renders a foreign key id as the name kept in a dictionary cache."""
+
+    def __init__(self, dictionary, **kwargs):
+        self.dictionary = dictionary
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if value is None:
+            return None
+        return self.dictionary.get_name(value)
+
+
+class FieldsPlan:
+    """Fields and nesting depth requested with ``?fields=`` and ``?depth=``.
+
+    ``fields`` is a comma separated list of dotted paths relative to the
+    listed object, e.g. ``id,name,categories.name``; naming a nested field
+    without sub-paths selects all of its fields. ``depth`` limits how many
+    levels of nested objects are rendered, ``0`` renders plain fields only.
+    """
+
+    def __init__(self, fields=None, depth=None):
+        self.fields = fields
+        self.depth = depth
+
+    @classmethod
+    def from_request(cls, request):
+        fields = request.query_params.get("fields")
+        if fields is not None:
+            fields = {
+                tuple(path.strip().split(".")) for path in fields.split(",") if path
+            }
+        depth = request.query_params.get("depth")
+        if depth is not None:
+            try:
+                depth = int(depth)
+            except ValueError:
+                raise serializers.ValidationError({"depth": "Ожидается целое число"})
+        return cls(fields, depth)
+
+    def includes(self, path, nested=True):
+        if nested and self.depth is not None and len(path) > self.depth:
+            return False
+        if self.fields is None:
+            return True
+        return any(
+            path[: len(requested)] == requested or requested[: len(path)] == path
+            for requested in self.fields
+        )
+
+
+class SparseFieldsMixin:
+    """Drops the fields left out by the ``fields_plan`` of the context."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        plan = self.context.get("fields_plan")
+        if plan is None:
+            return fields
+        path = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                path.insert(0, node.field_name)
+            node = node.parent
+        for name, field in list(fields.items()):
+            nested = isinstance(field, serializers.BaseSerializer)
+            if not plan.includes((*path, name), nested):
+                del fields[name]
+        return fields
+
+
 class ContactSerializer(serializers.ModelSerializer):
     class Meta:
         model = Contact
@@ -32,13 +109,26 @@ class ContactSerializer(serializers.ModelSerializer):
 
 class UserSerializer(serializers.ModelSerializer):
     contacts = ContactSerializer(read_only=True, many=True)
+    avatar = serializers.FileField(
+        source="avatar_thumbnail", read_only=True, use_url=True
+    )
 
     class Meta:
         model = User
-        fields = ["email", "username", "password", "type", "contacts"]
+        fields = [
+            "email",
+            "username",
+            "password",
+            "type",
+            "contacts",
+            "avatar_url",
+            "avatar",
+            "avatar_thumbnails",
+        ]
+        read_only_fields = ["avatar_thumbnails"]
 
 
-class ProductInfoSerializer(serializers.ModelSerializer):
+class ProductInfoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductInfo
         fields = [
@@ -52,8 +142,8 @@ class ProductInfoSerializer(serializers.ModelSerializer):
         ]
 
 
-class ProductSerializer(serializers.ModelSerializer):
-    category = serializers.StringRelatedField()
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category = DictionaryNameField(category_names, source="category_id")
     product_infos = ProductInfoSerializer(read_only=True, many=True)
 
     class Meta:
@@ -61,7 +151,7 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "category", "product_infos"]
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     products = ProductSerializer(read_only=True, many=True)
 
     class Meta:
@@ -70,7 +160,7 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class ShopSerializer(serializers.ModelSerializer):
+class ShopSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     categories = CategorySerializer(read_only=True, many=True)
 
     class Meta:
@@ -79,6 +169,46 @@ class ShopSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
+class BestOfferSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source="product.name", read_only=True)
+    shop_name = serializers.CharField(source="shop.name", read_only=True)
+
+    class Meta:
+        model = BestOffer
+        fields = [
+            "product",
+            "name",
+            "product_info",
+            "shop",
+            "shop_name",
+            "price",
+            "quantity",
+            "offers",
+        ]
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    rows_per_second = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "state",
+            "rows_processed",
+            "rows_per_second",
+            "inserted",
+            "updated",
+            "unchanged",
+            "removed",
+            "errors",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
 class ParameterSerializer(serializers.ModelSerializer):
     class Meta:
         model = Parameter
@@ -86,20 +216,54 @@ class ParameterSerializer(serializers.ModelSerializer):
 
 
 class ProductParameterSerializer(serializers.ModelSerializer):
-    parameter = serializers.StringRelatedField()
+    parameter = DictionaryNameField(parameter_names, source="parameter_id")
 
     class Meta:
         model = ProductParameter
         fields = ["product_info", "parameter", "value"]
 
 
+class OrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = ["order", "product_info", "quantity"]
+
+
 class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(source="ordered_items", read_only=True, many=True)
+    items_count = serializers.IntegerField(read_only=True)
+    total = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Order
-        fields = ["user", "dt", "state", "contact"]
+        fields = [
+            "id",
+            "user",
+            "dt",
+            "state",
+            "contact",
+            "items",
+            "items_count",
+            "total",
+        ]
+        read_only_fields = ["id"]
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class ShopOrderItemSerializer(serializers.ModelSerializer):
+    shop = serializers.IntegerField(source="product_info.shop_id", read_only=True)
+    external_id = serializers.IntegerField(
+        source="product_info.external_id", read_only=True
+    )
+    price = serializers.IntegerField(source="product_info.price", read_only=True)
+
     class Meta:
         model = OrderItem
-        fields = ["order", "product_info", "quantity"]
+        fields = ["product_info", "shop", "external_id", "quantity", "price"]
+
+
+class ShopOrderSerializer(serializers.ModelSerializer):
+    items = ShopOrderItemSerializer(source="shop_items", read_only=True, many=True)
+
+    class Meta:
+        model = Order
+        fields = ["id", "dt", "updated_at", "state", "contact", "items"]
@@ -1,52 +1,140 @@
 from celery import shared_task
-from django.core.mail import send_mail
-from orders.settings import EMAIL_HOST_PASSWORD, EMAIL_HOST_USER
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.mail import get_connection
+from django.utils import timezone
 import requests
 
+from backend.avatars import AvatarError, process_avatar
+from backend.carts import get_cart_store
+from backend.fetch import fetch_price_list
+from backend.importer import import_price_list
+from backend.mail import clear_wakeup, deliver_queued_mail, queue_mail
+from backend.models import STATE_CHOICES, ImportJob, User
+from backend.outbox import purge_outbox, relay_outbox
+from backend.price_list import iter_price_list
+
 
 @shared_task()
 def new_user_registered(email, token):
-    send_mail(
+    queue_mail(
         "Подтверждение электронной почты",
         f"Ваш ключ подтверждения: {token}",
-        EMAIL_HOST_USER,
         [email],
-        auth_password=EMAIL_HOST_PASSWORD,
-        fail_silently=False,
     )
 
 
 @shared_task()
 def user_email_confirmed(username, email):
-    send_mail(
+    queue_mail(
         "Подтверждение электронной почты",
         f"{username} адрес Вашей электронной почты: {email} подтвержден",
-        EMAIL_HOST_USER,
         [email],
-        auth_password=EMAIL_HOST_PASSWORD,
-        fail_silently=False,
     )
 
 
 @shared_task()
 def new_order(email):
-    send_mail(
+    queue_mail(
         "Обновление статуса заказа",
         "Заказ сформирован",
-        EMAIL_HOST_USER,
         [email],
-        auth_password=EMAIL_HOST_PASSWORD,
-        fail_silently=False,
     )
 
 
+@shared_task()
+def orders_state_changed(email, orders):
+    lines = "\n".join(
+        f"Заказ №{pk}: {dict(STATE_CHOICES)[state]}" for pk, state in orders
+    )
+    queue_mail(
+        "Обновление статуса заказа",
+        f"Статус заказов изменен:\n{lines}",
+        [email],
+    )
+
+
+@shared_task(bind=True, max_retries=3)
+def process_user_avatar(self, user_id):
+    user = User.objects.filter(id=user_id).first()
+    if not user or not user.avatar_url:
+        return None
+    try:
+        return process_avatar(user)
+    except AvatarError as error:
+        return str(error)
+    except requests.RequestException as error:
+        raise self.retry(exc=error, countdown=10 * 2**self.request.retries)
+
+
+@shared_task(bind=True)
+def import_shop_price_list(self, job_id):
+    job = ImportJob.objects.select_related("shop").get(id=job_id)
+    job.state = "running"
+    job.started_at = timezone.now()
+    job.save(update_fields=["state", "started_at"])
+
+    def progress(result):
+        if not self.request.called_directly:
+            self.update_state(state="PROGRESS", meta={"rows_processed": result.rows})
+
+    shop = job.shop
+    try:
+        with fetch_price_list(shop, job.url) as fetched:
+            if fetched.not_modified:
+                job.state = "skipped"
+            else:
+                result = import_price_list(
+                    shop, iter_price_list(fetched.file), progress=progress
+                )
+                job.state = "done"
+                job.rows_processed = result.rows
+                job.inserted = result.inserted
+                job.updated = result.updated
+                job.unchanged = result.unchanged
+                job.removed = result.removed
+                shop.url = job.url
+                shop.etag = fetched.etag
+                shop.last_modified = fetched.last_modified
+                shop.save(update_fields=["url", "etag", "last_modified"])
+    except Exception as error:
+        job.state = "failed"
+        job.errors = [str(error)]
+    job.finished_at = timezone.now()
+    job.save()
+    return job.state
+
+
+@shared_task
+def flush_carts():
+    return get_cart_store().flush()
+
+
+@shared_task(bind=True, max_retries=None)
+def send_queued_mail(self):
+    """Drain the mail queue over one SMTP connection, retrying with backoff."""
+    clear_wakeup()
+    connection = get_connection(fail_silently=False)
+    handled = 0
+    try:
+        while True:
+            count = deliver_queued_mail(connection=connection)
+            if not count:
+                return handled
+            handled += count
+    except OSError as error:
+        countdown = settings.EMAIL_RETRY_BACKOFF * 2 ** min(self.request.retries, 6)
+        raise self.retry(exc=error, countdown=countdown)
+    finally:
+        connection.close()
+
+
 @shared_task
-def process_user_avatar(user):
-    response = requests.get(user.avatar_url)
-    if response.status_code == 200:
-        image_data = response.content
-        user.avatar_thumbnail.save(
-            f"{user.username}_thumbnail.jpg", ContentFile(image_data), save=False
-        )
-        user.save()
+def relay_outbox_events():
+    published = 0
+    while True:
+        count = relay_outbox()
+        published += count
+        if count < settings.OUTBOX_BATCH_SIZE:
+            break
+    purge_outbox()
+    return published
@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from backend.models import Order, OrderItem
+
+ALLOWED_TRANSITIONS = {
+    "new": {"confirmed", "canceled"},
+    "confirmed": {"assembled", "canceled"},
+    "assembled": {"sent", "canceled"},
+    "sent": {"delivered"},
+}
+
+
+def source_states(target):
+    return {
+        state for state, targets in ALLOWED_TRANSITIONS.items() if target in targets
+    }
+
+
+def transition_orders(shop_user, transitions):
+    """Move orders of ``shop_user``'s shops to new states in bulk.
+
+    ``transitions`` maps order ids to target states. The current states are
+    read (and locked) in one query, every allowed target state is applied
+    with one UPDATE. Returns ``(results, changed)``: an ``order id -> error
+    or None`` dict and a ``user id -> [(order id, state), ...]`` dict of the
+    orders that moved.
+    """
+    lines = OrderItem.objects.filter(
+        order_id=OuterRef("pk"), product_info__shop__user=shop_user
+    )
+    with transaction.atomic():
+        current = {
+            pk: (state, user_id)
+            for pk, state, user_id in Order.objects.select_for_update()
+            .filter(Exists(lines), id__in=transitions.keys())
+            .values_list("id", "state", "user_id")
+        }
+        results = {}
+        by_target = defaultdict(list)
+        for pk, target in transitions.items():
+            if pk not in current:
+                results[pk] = "Заказ не найден"
+            elif target not in ALLOWED_TRANSITIONS.get(current[pk][0], ()):
+                results[pk] = f"Недопустимый переход: {current[pk][0]} -> {target}"
+            else:
+                results[pk] = None
+                by_target[target].append(pk)
+
+        now = timezone.now()
+        changed = defaultdict(list)
+        for target, ids in by_target.items():
+            Order.objects.filter(id__in=ids, state__in=source_states(target)).update(
+                state=target, updated_at=now
+            )
+            for pk in ids:
+                changed[current[pk][1]].append((pk, target))
+    return results, changed
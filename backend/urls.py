@@ -8,12 +8,19 @@ from .views import (
     ShopView,
     CreateShopView,
     UpdateShopView,
+    ImportJobView,
     UpdateShopStatusView,
     CategoryView,
     ProductsView,
+    ProductFacetsView,
+    BestOffersView,
+    CatalogCacheStatsView,
     CartView,
+    CheckoutView,
+    CartBatchView,
     ContactView,
     ShopOrdersView,
+    BulkOrderStateView,
     UserOrdersView,
 )
 
@@ -26,11 +33,18 @@ urlpatterns = [
     path("shops/", ShopView.as_view(), name="shops"),
     path("shops/create", CreateShopView.as_view(), name="shop-create"),
     path("shops/update", UpdateShopView.as_view(), name="shop-update"),
+    path("shops/import/<int:job_id>", ImportJobView.as_view(), name="shop-import"),
     path("shops/status", UpdateShopStatusView.as_view(), name="shop-update-status"),
     path("shops/orders", ShopOrdersView.as_view(), name="shop-orders"),
+    path("shops/orders/state", BulkOrderStateView.as_view(), name="shop-orders-state"),
     path("category/", CategoryView.as_view(), name="category"),
+    path("catalog/cache", CatalogCacheStatsView.as_view(), name="catalog-cache"),
     path("cart/", CartView.as_view(), name="cart"),
+    path("cart/batch", CartBatchView.as_view(), name="cart-batch"),
+    path("cart/checkout", CheckoutView.as_view(), name="checkout"),
     path("contacts/", ContactView.as_view(), name="contacts"),
     path("products/", ProductsView.as_view(), name="products"),
     path("products/search/", SearchProductView.as_view(), name="search"),
+    path("products/facets/", ProductFacetsView.as_view(), name="product-facets"),
+    path("products/best-offers", BestOffersView.as_view(), name="best-offers"),
 ]
@@ -1,48 +1,73 @@
+from datetime import timedelta
 from distutils.util import strtobool
 
+from django.conf import settings
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db import transaction
 from django.db.utils import IntegrityError
+from django.utils import timezone
 
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
+from rest_framework.pagination import PageNumberPagination
 
-from requests import get
-from yaml import load as load_yaml, Loader
+from celery.result import AsyncResult
 
 from backend.models import (
     ConfirmEmailToken,
+    ImportJob,
     Shop,
     Category,
-    ProductInfo,
     Product,
-    Parameter,
-    ProductParameter,
     Order,
     OrderItem,
     Contact,
+    BestOffer,
+    ProductInfo,
+)
+from backend.carts import apply_cart_lines, get_cart_store
+from backend.catalog_cache import (
+    CatalogCacheMixin,
+    bump_catalog_version,
+    cache_stats,
+)
+from backend.checkout import CheckoutError, OutOfStock, checkout
+from backend.dictionaries import parameter_names
+from backend.facets import facet_counts, filter_products, parse_facet_filters
+from backend.offers import refresh_best_offers
+from backend.outbox import publish_event
+from backend.pagination import (
+    KeysetPagination,
+    ProductKeyPagination,
+    RecentFirstPagination,
+    decode_since,
+    encode_since,
 )
 from backend.permissions import IsShop
+from backend.search import search_products
+from backend.transitions import transition_orders
 from backend.serializers import (
+    FieldsPlan,
     UserSerializer,
     ShopSerializer,
     CategorySerializer,
     ProductSerializer,
     OrderSerializer,
     ContactSerializer,
+    ImportJobSerializer,
+    BestOfferSerializer,
+    ShopOrderSerializer,
 )
-from backend.tasks import (
-    new_user_registered,
-    user_email_confirmed,
-    new_order,
-    process_user_avatar,
-)
+from backend.tasks import import_shop_price_list
 
 User = get_user_model()
 
@@ -61,19 +86,19 @@ class RegisterUserView(APIView):
                     {"error": error_array}, status=status.HTTP_400_BAD_REQUEST
                 )
             user_type = serializer.validated_data.get("type", "buyer")
-            user = User.objects.create_user(
-                email=serializer.validated_data["email"],
-                username=serializer.validated_data["username"],
-                password=serializer.validated_data["password"],
-                type=user_type,
-            )
-            user.save()
-            if user.avatar_url:
-                process_user_avatar.delay(user)
-
-            token = ConfirmEmailToken.objects.create(user=user)
-
-            new_user_registered.delay(token=token.key, email=user.email)
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    email=serializer.validated_data["email"],
+                    username=serializer.validated_data["username"],
+                    password=serializer.validated_data["password"],
+                    type=user_type,
+                    avatar_url=serializer.validated_data.get("avatar_url"),
+                )
+                user.save()
+                token = ConfirmEmailToken.objects.create(user=user)
+                publish_event("user.registered", token=token.key, email=user.email)
+                if user.avatar_url:
+                    publish_event("user.avatar_changed", user_id=user.id)
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -85,9 +110,12 @@ class ConfirmEmailView(APIView):
         try:
             token = ConfirmEmailToken.objects.get(key=key)
             user = token.user
-            user.is_active = True
-            user.save()
-            user_email_confirmed.delay(username=user.username, email=user.email)
+            with transaction.atomic():
+                user.is_active = True
+                user.save()
+                publish_event(
+                    "user.email_confirmed", username=user.username, email=user.email
+                )
             return Response(
                 {"message": "Адрес электронной почты подтвержден"},
                 status=status.HTTP_200_OK,
@@ -120,9 +148,13 @@ class UserDetailsView(APIView):
         return Response(serializer.data)
 
     def put(self, request):
+        avatar_url = request.user.avatar_url
         serializer = UserSerializer(request.user, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                user = serializer.save()
+                if user.avatar_url and user.avatar_url != avatar_url:
+                    publish_event("user.avatar_changed", user_id=user.id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -143,10 +175,64 @@ class ContactView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ShopView(ListAPIView):
-    queryset = Shop.objects.filter(state=True)
+FULL_PLAN = FieldsPlan()
+
+
+def product_queryset(plan=FULL_PLAN, prefix=()):
+    queryset = Product.objects.all()
+    if plan.includes((*prefix, "product_infos")):
+        queryset = queryset.prefetch_related("product_infos")
+    return queryset
+
+
+def category_queryset(plan=FULL_PLAN, prefix=()):
+    queryset = Category.objects.all()
+    path = (*prefix, "products")
+    if plan.includes(path):
+        queryset = queryset.prefetch_related(
+            Prefetch("products", queryset=product_queryset(plan, path))
+        )
+    return queryset
+
+
+def shop_queryset(plan=FULL_PLAN):
+    queryset = Shop.objects.all()
+    if plan.includes(("categories",)):
+        queryset = queryset.prefetch_related(
+            Prefetch("categories", queryset=category_queryset(plan, ("categories",)))
+        )
+    return queryset
+
+
+def order_queryset():
+    return Order.objects.annotate(
+        items_count=Count("ordered_items"),
+        total=Coalesce(
+            Sum(F("ordered_items__quantity") * F("ordered_items__product_info__price")),
+            0,
+        ),
+    ).prefetch_related("ordered_items")
+
+
+class SparseFieldsViewMixin:
+    def get_fields_plan(self):
+        if not hasattr(self, "_fields_plan"):
+            self._fields_plan = FieldsPlan.from_request(self.request)
+        return self._fields_plan
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields_plan"] = self.get_fields_plan()
+        return context
+
+
+class ShopView(CatalogCacheMixin, SparseFieldsViewMixin, ListAPIView):
+    pagination_class = KeysetPagination
     serializer_class = ShopSerializer
 
+    def get_queryset(self):
+        return shop_queryset(self.get_fields_plan()).filter(state=True)
+
 
 class CreateShopView(APIView):
     permission_classes = [IsAuthenticated, IsShop]
@@ -188,42 +274,10 @@ class UpdateShopView(APIView):
                         {"error": str(e)}, status=status.HTTP_400_BAD_REQUEST
                     )
                 else:
-                    stream = get(url).content
-
-                    data = load_yaml(stream, Loader=Loader)
-                    for category in data["categories"]:
-                        category_object, _ = Category.objects.get_or_create(
-                            id=category["id"], name=category["name"]
-                        )
-                        category_object.shops.add(shop.id)
-                        category_object.save()
-                    ProductInfo.objects.filter(shop_id=shop.id).delete()
-                    for item in data["goods"]:
-                        product, _ = Product.objects.get_or_create(
-                            name=item["name"], category_id=item["category"]
-                        )
-                        product_info = ProductInfo.objects.create(
-                            product_id=product.id,
-                            external_id=item["id"],
-                            model=item["model"],
-                            price=item["price"],
-                            price_rrc=item["price_rrc"],
-                            quantity=item["quantity"],
-                            shop_id=shop.id,
-                        )
-                        for name, value in item["parameters"].items():
-                            parameter_object, _ = Parameter.objects.get_or_create(
-                                name=name
-                            )
-                            ProductParameter.objects.create(
-                                product_info_id=product_info.id,
-                                parameter_id=parameter_object.id,
-                                value=value,
-                            )
-                    return Response(
-                        {"message": "Информация о магазине обновлена"},
-                        status=status.HTTP_200_OK,
-                    )
+                    job = ImportJob.objects.create(shop=shop, url=url)
+                    job.task_id = import_shop_price_list.delay(job.id).id
+                    job.save(update_fields=["task_id"])
+                    return Response({"job_id": job.id}, status=status.HTTP_202_ACCEPTED)
             serializer = ShopSerializer(shop, data=request.data)
             if serializer.is_valid():
                 serializer.save()
@@ -235,6 +289,22 @@ class UpdateShopView(APIView):
         )
 
 
+class ImportJobView(APIView):
+    permission_classes = [IsAuthenticated, IsShop]
+
+    def get(self, request, job_id):
+        job = ImportJob.objects.filter(id=job_id, shop__user=request.user).first()
+        if not job:
+            return Response(
+                {"error": "Загрузка не найдена"}, status=status.HTTP_404_NOT_FOUND
+            )
+        if job.state == "running" and job.task_id and settings.CELERY_RESULT_BACKEND:
+            info = AsyncResult(job.task_id).info
+            if isinstance(info, dict):
+                job.rows_processed = info.get("rows_processed", job.rows_processed)
+        return Response(ImportJobSerializer(job).data)
+
+
 class UpdateShopStatusView(APIView):
     permission_classes = [IsAuthenticated, IsShop]
 
@@ -245,6 +315,12 @@ class UpdateShopStatusView(APIView):
                 Shop.objects.filter(user_id=request.user.id).update(
                     state=strtobool(state)
                 )
+                refresh_best_offers(
+                    ProductInfo.objects.filter(
+                        shop__user_id=request.user.id
+                    ).values_list("product_id", flat=True)
+                )
+                bump_catalog_version()
                 return Response({"message": "Status updated"})
             except ValueError as error:
                 return Response(
@@ -255,84 +331,301 @@ class UpdateShopStatusView(APIView):
         )
 
 
-class CategoryView(ListAPIView):
-    queryset = Category.objects.all()
+class CategoryView(CatalogCacheMixin, SparseFieldsViewMixin, ListAPIView):
+    pagination_class = KeysetPagination
     serializer_class = CategorySerializer
 
+    def get_queryset(self):
+        return category_queryset(self.get_fields_plan())
 
-class ProductsView(ListAPIView):
-    queryset = Product.objects.all()
+
+class ProductsView(CatalogCacheMixin, SparseFieldsViewMixin, ListAPIView):
+    pagination_class = KeysetPagination
     serializer_class = ProductSerializer
 
+    def get_queryset(self):
+        return filter_products(
+            product_queryset(self.get_fields_plan()),
+            parse_facet_filters(self.request),
+        )
+
+
+class BestOffersView(CatalogCacheMixin, ListAPIView):
+    pagination_class = ProductKeyPagination
+    serializer_class = BestOfferSerializer
+
+    def get_queryset(self):
+        queryset = BestOffer.objects.select_related("product", "shop")
+        category = self.request.query_params.get("category", "")
+        if category.isdigit():
+            queryset = queryset.filter(product__category_id=category)
+        products = self.request.query_params.get("product")
+        if products:
+            queryset = queryset.filter(
+                product_id__in=[pk for pk in products.split(",") if pk.isdigit()]
+            )
+        return queryset
+
+
+class CatalogCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
 
-class SearchProductView(APIView):
     def get(self, request):
-        query = request.query_params.get("query", "")
-        products = Product.objects.filter(name__icontains=query)
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        return Response(cache_stats())
+
+
+class ProductFacetsView(APIView):
+    def get(self, request):
+        counts = facet_counts(parse_facet_filters(request))
+        names = parameter_names.get_names(counts)
+        facets = [
+            {
+                "parameter": names[parameter_id],
+                "values": [
+                    {"value": value, "count": count}
+                    for value, count in sorted(
+                        values.items(), key=lambda item: (-item[1], item[0])
+                    )
+                ],
+            }
+            for parameter_id, values in counts.items()
+        ]
+        facets.sort(key=lambda facet: facet["parameter"])
+        return Response(facets)
+
+
+class SearchProductView(CatalogCacheMixin, SparseFieldsViewMixin, ListAPIView):
+    serializer_class = ProductSerializer
+    pagination_class = PageNumberPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get("query", "")
+        return search_products(query, product_queryset(self.get_fields_plan()))
 
 
 class CartView(APIView):
     permission_classes = [IsAuthenticated]
 
+    def cart_response(self, items):
+        if not items:
+            return Response({"message": "Корзина пуста"})
+        return Response(
+            [
+                {"product_info": pk, "quantity": quantity}
+                for pk, quantity in sorted(items.items())
+            ]
+        )
+
     def get(self, request):
-        order = Order.objects.filter(user=request.user, state="basket").first()
-        if order:
-            serializer = OrderSerializer(order)
-            return Response(serializer.data)
-        return Response({"message": "Корзина пуста"})
+        return self.cart_response(get_cart_store().get(request.user.id))
 
     def post(self, request):
-        product_id = request.data.get("product_id")
-        quantity = request.data.get("quantity", 1)
-        product = Product.objects.filter(id=product_id).first()
-        if product:
-            order = Order.objects.filter(user=request.user, state="basket")
-            if not order:
-                order = Order.objects.create(user=request.user, state="basket")
-            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        product_info_id = request.data.get("product_info_id")
+        try:
+            quantity = int(request.data.get("quantity", 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity < 1:
+            return Response(
+                {"error": "Неверное количество"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if (
+            str(product_info_id).isdigit()
+            and ProductInfo.objects.filter(id=product_info_id).exists()
+        ):
+            get_cart_store().add(request.user.id, int(product_info_id), quantity)
             return Response({"message": "Товар добавлен в корзину"})
         return Response(
             {"error": "Товар не найден"}, status=status.HTTP_400_BAD_REQUEST
         )
 
     def delete(self, request):
-        product_id = request.data.get("product_id")
-        order = Order.objects.filter(user=request.user, state="cart").first()
-        if order:
-            item = OrderItem.objects.filter(order=order, product_id=product_id).first()
-            if item:
-                item.delete()
-                return Response({"message": "Товар удален из корзины"})
+        product_info_id = request.data.get("product_info_id")
+        store = get_cart_store()
+        items = store.get(request.user.id)
+        if not items:
+            return Response(
+                {"error": "Коpзина пуста"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if str(product_info_id).isdigit() and int(product_info_id) in items:
+            store.update(request.user.id, {int(product_info_id): 0})
+            return Response({"message": "Товар удален из корзины"})
+        return Response(
+            {"error": "Товар не найден"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+class CartBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_lines = 100
+
+    def post(self, request):
+        lines = request.data.get("items")
+        if not isinstance(lines, list) or not lines:
             return Response(
-                {"error": "Товар не найден"}, status=status.HTTP_400_BAD_REQUEST
+                {"error": "Не указаны позиции"}, status=status.HTTP_400_BAD_REQUEST
             )
-        return Response({"error": "Коpзина пуста"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(lines) > self.max_lines:
+            return Response(
+                {"error": f"Не более {self.max_lines} позиций за запрос"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        results = apply_cart_lines(get_cart_store(), request.user.id, lines)
+        return Response({"results": results})
+
+
+class CheckoutView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        store = get_cart_store()
+        store.flush([request.user.id])
+        order = Order.objects.filter(user=request.user, state="basket").first()
+        if not order:
+            return Response(
+                {"error": "Корзина пуста"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        contact = None
+        contact_id = request.data.get("contact_id")
+        if contact_id:
+            contact = Contact.objects.filter(id=contact_id, user=request.user).first()
+            if not contact:
+                return Response(
+                    {"error": "Контакт не найден"}, status=status.HTTP_400_BAD_REQUEST
+                )
+        try:
+            with transaction.atomic():
+                checkout(order, contact)
+                publish_event("order.created", email=request.user.email)
+        except OutOfStock as error:
+            return Response(
+                {
+                    "error": str(error),
+                    "shortages": [
+                        {
+                            "product_info": pk,
+                            "requested": requested,
+                            "available": available,
+                        }
+                        for pk, (requested, available) in error.shortages.items()
+                    ],
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        except CheckoutError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        store.forget(request.user.id)
+        return Response(OrderSerializer(order).data)
 
 
 class ShopOrdersView(APIView):
     permission_classes = [IsAuthenticated, IsShop]
+    page_size = 50
+    max_page_size = 500
 
     def get(self, request):
-        orders = Order.objects.filter(shop__user=request.user)
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        try:
+            limit = min(
+                int(request.query_params.get("limit", self.page_size)),
+                self.max_page_size,
+            )
+        except ValueError:
+            limit = self.page_size
+        lines = OrderItem.objects.filter(product_info__shop__user=request.user)
+        # updated_at is stamped before commit, so recent changes wait for
+        # transactions that could still commit behind them
+        settled = timezone.now() - timedelta(seconds=settings.SHOP_ORDER_FEED_LAG)
+        orders = Order.objects.filter(
+            Exists(lines.filter(order_id=OuterRef("pk"))), updated_at__lte=settled
+        ).exclude(state="basket")
+        since = request.query_params.get("since")
+        if since:
+            updated_at, pk = decode_since(since)
+            orders = orders.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+            )
+        orders = list(
+            orders.order_by("updated_at", "id").prefetch_related(
+                Prefetch(
+                    "ordered_items",
+                    queryset=lines.select_related("product_info"),
+                    to_attr="shop_items",
+                )
+            )[: max(limit, 1)]
+        )
+        if orders:
+            since = encode_since(orders[-1].updated_at, orders[-1].id)
+        return Response(
+            {
+                "results": ShopOrderSerializer(orders, many=True).data,
+                "next_since": since,
+            }
+        )
+
+
+class BulkOrderStateView(APIView):
+    permission_classes = [IsAuthenticated, IsShop]
+    max_orders = 1000
+
+    def post(self, request):
+        orders = request.data.get("orders")
+        if not isinstance(orders, list) or not orders:
+            return Response(
+                {"error": "Не указаны заказы"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(orders) > self.max_orders:
+            return Response(
+                {"error": f"Не более {self.max_orders} заказов за запрос"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            transitions = {int(order["id"]): str(order["state"]) for order in orders}
+        except (KeyError, TypeError, ValueError):
+            return Response(
+                {"error": "Неверный формат заказов"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            results, changed = transition_orders(request.user, transitions)
+            emails = dict(
+                User.objects.filter(id__in=changed).values_list("id", "email")
+            )
+            for user_id, user_orders in changed.items():
+                publish_event(
+                    "orders.state_changed", email=emails[user_id], orders=user_orders
+                )
+        return Response(
+            {
+                "results": [
+                    {
+                        "id": pk,
+                        "state": transitions[pk],
+                        "updated": error is None,
+                        "error": error,
+                    }
+                    for pk, error in results.items()
+                ]
+            }
+        )
 
 
 class UserOrdersView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        orders = Order.objects.filter(user=request.user)
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        orders = order_queryset().filter(user=request.user).exclude(state="basket")
+        paginator = RecentFirstPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        serializer = OrderSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         serializer = OrderSerializer(data=request.data)
         user = request.user
         if serializer.is_valid():
-            serializer.save(user=user)
-            new_order.delay(user.email)
+            with transaction.atomic():
+                serializer.save(user=user)
+                publish_event("order.created", email=user.email)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "django_rest_passwordreset",
@@ -144,6 +145,16 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 EMAIL_PORT = os.getenv("EMAIL_PORT")
 EMAIL_USE_SSL = os.getenv("EMAIL_USE_SSL")
 SERVER_EMAIL = os.getenv("SERVER_EMAIL")
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 100))
+# messages per second over one connection, 0 means no limit
+EMAIL_RATE_LIMIT = float(os.getenv("EMAIL_RATE_LIMIT", 0))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+EMAIL_RETRY_BACKOFF = int(os.getenv("EMAIL_RETRY_BACKOFF", 30))
+# seconds a claimed batch may take before other senders pick it up again
+EMAIL_LEASE_TIMEOUT = int(os.getenv("EMAIL_LEASE_TIMEOUT", 600))
+# at most one sender is woken up per this many seconds, beat does the rest
+EMAIL_WAKEUP_TIMEOUT = int(os.getenv("EMAIL_WAKEUP_TIMEOUT", 10))
+EMAIL_QUEUE_INTERVAL = float(os.getenv("EMAIL_QUEUE_INTERVAL", 60))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -154,10 +165,15 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
-    "DEFAULT_RENDERER_CLASSES": (
-        "rest_framework.renderers.JSONRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",
-    ),
+    "DEFAULT_RENDERER_CLASSES": [
+        "backend.renderers.FastJSONRenderer",
+        *(["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "backend.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.TokenAuthentication"
     ],
@@ -174,9 +190,69 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+JSON_BACKEND = os.getenv("JSON_BACKEND")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalog": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("CATALOG_CACHE_URL"),
+        }
+        if os.getenv("CATALOG_CACHE_URL")
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "catalog",
+        }
+    ),
+}
+CATALOG_CACHE_ALIAS = "catalog"
+# how long cached catalog responses may show stock changed by checkouts
+CATALOG_STOCK_TIMEOUT = int(os.getenv("CATALOG_STOCK_TIMEOUT", 30))
+# how often category and parameter names are checked for renames elsewhere
+DICTIONARY_CHECK_INTERVAL = float(os.getenv("DICTIONARY_CHECK_INTERVAL", 1))
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+PRICE_LIST_FETCH_TIMEOUT = int(os.getenv("PRICE_LIST_FETCH_TIMEOUT", 60))
+PRICE_LIST_MAX_SIZE = int(os.getenv("PRICE_LIST_MAX_SIZE", 512 * 1024 * 1024))
+PRICE_LIST_POOL_SIZE = int(os.getenv("PRICE_LIST_POOL_SIZE", 10))
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "russian")
+
+CART_STORE = os.getenv("CART_STORE", "database")
+CART_STORE_URL = os.getenv("CART_STORE_URL", "redis://127.0.0.1:6379/1")
+CART_STORE_TTL = int(os.getenv("CART_STORE_TTL", 7 * 24 * 3600))
+CART_FLUSH_INTERVAL = int(os.getenv("CART_FLUSH_INTERVAL", 60))
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 500))
+OUTBOX_RELAY_INTERVAL = float(os.getenv("OUTBOX_RELAY_INTERVAL", 5))
+OUTBOX_RETENTION = int(os.getenv("OUTBOX_RETENTION", 7 * 24 * 3600))
+
+# seconds an order change must age before the shop order feed serves it,
+# longer than any transaction that touches orders
+SHOP_ORDER_FEED_LAG = float(os.getenv("SHOP_ORDER_FEED_LAG", 5))
+
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
 CELERY_IMPORTS = ["backend.tasks"]
+CELERY_TASK_ROUTES = {
+    "backend.tasks.import_shop_price_list": {"queue": "imports"},
+}
+CELERY_BEAT_SCHEDULE = {
+    "flush-carts": {
+        "task": "backend.tasks.flush_carts",
+        "schedule": CART_FLUSH_INTERVAL,
+    },
+    "relay-outbox": {
+        "task": "backend.tasks.relay_outbox_events",
+        "schedule": OUTBOX_RELAY_INTERVAL,
+    },
+    "send-queued-mail": {
+        "task": "backend.tasks.send_queued_mail",
+        "schedule": EMAIL_QUEUE_INTERVAL,
+    },
+}
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "Orders App API",
@@ -208,6 +284,9 @@ SOCIAL_AUTH_VK_OAUTH2_KEY = os.getenv("SOCIAL_AUTH_VK_OAUTH2_KEY")
 SOCIAL_AUTH_VK_OAUTH2_SECRET = os.getenv("SOCIAL_AUTH_VK_OAUTH2_SECRET")
 SOCIAL_AUTH_VK_OAUTH2_SCOPE = ["email"]
 
+AVATAR_MAX_SIZE = int(os.getenv("AVATAR_MAX_SIZE", 5 * 1024 * 1024))
+AVATAR_FETCH_TIMEOUT = int(os.getenv("AVATAR_FETCH_TIMEOUT", 10))
+
 THUMBNAIL_ALIASES = {
     "": {
         "avatar": {"size": (100, 100), "crop": True},
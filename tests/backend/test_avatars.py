@@ -0,0 +1,84 @@
+from io import BytesIO
+from tempfile import TemporaryDirectory
+
+from django.test import override_settings
+from django.urls import reverse
+from model_bakery import baker
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from backend.avatars import AvatarError, download_avatar, process_avatar
+from backend.models import OutboxEvent, User
+from backend.tasks import process_user_avatar
+from tests.backend.utils import PriceListServer
+
+
+def make_image(color="red", size=(300, 200)):
+    stream = BytesIO()
+    Image.new("RGB", size, color).save(stream, "PNG")
+    return stream.getvalue()
+
+
+class AvatarPipelineTestCase(APITestCase):
+    def setUp(self):
+        media = TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def test_thumbnails_are_generated_once_per_image(self):
+        with PriceListServer(make_image()) as server:
+            first = baker.make(User, avatar_url=server.url)
+            second = baker.make(User, avatar_url=server.url)
+            process_user_avatar.apply(args=[first.id])
+            with self.assertNumQueries(3):
+                process_user_avatar.apply(args=[second.id])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.avatar_thumbnail.name, second.avatar_thumbnail.name)
+        self.assertEqual(first.avatar_thumbnails, second.avatar_thumbnails)
+        self.assertEqual(set(first.avatar_thumbnails), {"avatar"})
+        with Image.open(first.avatar_thumbnail.path) as image:
+            self.assertEqual(image.size, (300, 200))
+
+        self.client.force_authenticate(first)
+        response = self.client.get(reverse("user-details"))
+        self.assertEqual(response.data["avatar_thumbnails"], first.avatar_thumbnails)
+        self.assertTrue(response.data["avatar"].endswith(".png"))
+
+    def test_unchanged_avatar_is_skipped(self):
+        with PriceListServer(make_image()) as server:
+            user = baker.make(User, avatar_url=server.url)
+            digest = process_avatar(user)
+            user.refresh_from_db()
+            with self.assertNumQueries(0):
+                self.assertEqual(process_avatar(user), digest)
+
+    def test_size_cap(self):
+        with PriceListServer(make_image(size=(2000, 2000))) as server:
+            with self.assertRaises(AvatarError):
+                download_avatar(server.url, max_size=1024)
+
+    def test_not_an_image(self):
+        with PriceListServer(b"<html></html>") as server:
+            user = baker.make(User, avatar_url=server.url)
+            result = process_user_avatar.apply(args=[user.id]).get()
+        self.assertIn("not an image", result)
+        user.refresh_from_db()
+        self.assertFalse(user.avatar_thumbnail)
+
+    def test_registration_queues_avatar_by_id(self):
+        response = self.client.post(
+            reverse("user-register"),
+            {
+                "email": "buyer@example.com",
+                "username": "buyer",
+                "password": "Sup3r-secret-pass",
+                "avatar_url": "http://127.0.0.1/avatar.png",
+            },
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        event = OutboxEvent.objects.get(event="user.avatar_changed")
+        user = User.objects.get(email="buyer@example.com")
+        self.assertEqual(event.payload, {"user_id": user.id})
@@ -0,0 +1,236 @@
+from unittest.mock import patch
+
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+import fakeredis
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from backend.carts import LocalCartStore, RedisCartStore, load_basket, save_basket
+from backend.models import Order, OrderItem, ProductInfo, Shop, User
+from backend.tasks import flush_carts
+
+
+class SaveBasketTestCase(APITestCase):
+    def setUp(self):
+        self.user = baker.make(User)
+        self.offers = baker.make(ProductInfo, shop=baker.make(Shop), _quantity=3)
+
+    def test_upsert_and_replace(self):
+        first, second, third = (offer.id for offer in self.offers)
+        save_basket(self.user.id, {first: 1, second: 2})
+        save_basket(self.user.id, {second: 5, first: 0})
+        self.assertEqual(load_basket(self.user.id), {second: 5})
+        save_basket(self.user.id, {third: 1}, replace=True)
+        self.assertEqual(load_basket(self.user.id), {third: 1})
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_deleted_offers_are_dropped(self):
+        first, second, _ = self.offers
+        save_basket(self.user.id, {first.id: 1})
+        second.delete()
+        save_basket(self.user.id, {first.id: 2, second.id: 1}, replace=True)
+        self.assertEqual(load_basket(self.user.id), {first.id: 2})
+
+    def test_empty_cart_creates_no_order(self):
+        self.assertIsNone(save_basket(self.user.id, {}))
+        self.assertFalse(Order.objects.exists())
+
+
+@override_settings(CART_STORE="local")
+class LocalCartStoreTestCase(APITestCase):
+    def setUp(self):
+        self.user = baker.make(User)
+        self.client.force_authenticate(self.user)
+        self.offer = baker.make(ProductInfo, shop=baker.make(Shop), quantity=10)
+
+    def test_cart_is_written_behind(self):
+        url = reverse("cart")
+        self.client.post(url, {"product_info_id": self.offer.id, "quantity": 2})
+        self.client.post(url, {"product_info_id": self.offer.id})
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(
+            response.data, [{"product_info": self.offer.id, "quantity": 3}]
+        )
+        self.assertFalse(OrderItem.objects.exists())
+
+        self.assertEqual(flush_carts(), 1)
+        self.assertEqual(load_basket(self.user.id), {self.offer.id: 3})
+        self.assertEqual(flush_carts(), 0)
+
+        self.client.delete(url, {"product_info_id": self.offer.id})
+        flush_carts()
+        self.assertEqual(load_basket(self.user.id), {})
+
+    def test_checkout_persists_cart(self):
+        self.client.post(reverse("cart"), {"product_info_id": self.offer.id})
+        response = self.client.post(reverse("checkout"))
+        self.assertEqual(response.status_code, 200)
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.quantity, 9)
+        response = self.client.get(reverse("cart"))
+        self.assertEqual(response.data, {"message": "Корзина пуста"})
+
+    def test_failing_cart_does_not_block_others(self):
+        other = baker.make(User)
+        store = LocalCartStore()
+        store.add(self.user.id, self.offer.id, 1)
+        store.add(other.id, self.offer.id, 2)
+
+        def save(user_id, items, replace=False):
+            if user_id == self.user.id:
+                raise DatabaseError
+            return save_basket(user_id, items, replace)
+
+        with patch("backend.carts.save_basket", side_effect=save):
+            with self.assertRaises(DatabaseError):
+                store.flush()
+        self.assertEqual(load_basket(other.id), {self.offer.id: 2})
+        self.assertEqual(store.flush(), 1)
+        self.assertEqual(load_basket(self.user.id), {self.offer.id: 1})
+
+    def test_loads_existing_basket(self):
+        save_basket(self.user.id, {self.offer.id: 4})
+        store = LocalCartStore()
+        self.assertEqual(store.get(self.user.id), {self.offer.id: 4})
+        store.add(self.user.id, self.offer.id, 1)
+        store.forget(self.user.id)
+        self.assertEqual(store.flush(), 0)
+        self.assertEqual(store.get(self.user.id), {self.offer.id: 4})
+
+
+class RedisCartStoreTestCase(TestCase):
+    def setUp(self):
+        self.user = baker.make(User)
+        self.offers = baker.make(ProductInfo, shop=baker.make(Shop), _quantity=2)
+        self.redis = fakeredis.FakeRedis()
+        self.store = RedisCartStore(self.redis, ttl=60)
+
+    def test_add_and_update(self):
+        first, second = (offer.id for offer in self.offers)
+        save_basket(self.user.id, {first: 4})
+        self.assertEqual(self.store.get(self.user.id), {first: 4})
+        self.store.add(self.user.id, first, 1)
+        self.store.add(self.user.id, second, 2)
+        self.assertEqual(self.store.get(self.user.id), {first: 5, second: 2})
+        self.store.update(self.user.id, {first: 0, second: 3})
+        self.assertEqual(self.store.get(self.user.id), {second: 3})
+        self.assertEqual(self.redis.ttl(f"cart:{self.user.id}"), -1)
+
+    def test_changes_are_written_behind(self):
+        first, second = (offer.id for offer in self.offers)
+        save_basket(self.user.id, {first: 1})
+        self.store.update(self.user.id, {first: 0, second: 2})
+        self.assertEqual(load_basket(self.user.id), {first: 1})
+
+        self.assertEqual(self.store.flush(), 1)
+        self.assertEqual(load_basket(self.user.id), {second: 2})
+        self.assertEqual(self.store.flush(), 0)
+        self.assertGreater(self.redis.ttl(f"cart:{self.user.id}"), 0)
+
+        # an emptied cart stays loaded and is persisted as empty
+        self.store.update(self.user.id, {second: 0})
+        self.assertEqual(self.store.get(self.user.id), {})
+        self.assertEqual(self.store.flush([self.user.id]), 1)
+        self.assertEqual(load_basket(self.user.id), {})
+
+    def test_failed_flush_keeps_cart_dirty(self):
+        self.store.add(self.user.id, self.offers[0].id, 1)
+        with patch("backend.carts.save_basket", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.store.flush()
+        self.assertEqual(self.store.flush(), 1)
+        self.assertEqual(load_basket(self.user.id), {self.offers[0].id: 1})
+
+    def test_failing_cart_does_not_block_others(self):
+        other = baker.make(User)
+        offer = self.offers[0]
+        self.store.add(self.user.id, offer.id, 1)
+        self.store.add(other.id, offer.id, 2)
+        self.store.add(other.id, self.offers[1].id, 1)
+        self.offers[1].delete()
+
+        def save(user_id, items, replace=False):
+            if user_id == self.user.id:
+                raise DatabaseError
+            return save_basket(user_id, items, replace)
+
+        with patch("backend.carts.save_basket", side_effect=save):
+            with self.assertRaises(DatabaseError):
+                self.store.flush()
+        self.assertEqual(load_basket(other.id), {offer.id: 2})
+        self.assertEqual(self.redis.ttl(f"cart:{self.user.id}"), -1)
+        self.assertEqual(self.store.flush(), 1)
+        self.assertEqual(load_basket(self.user.id), {offer.id: 1})
+
+    def test_forget(self):
+        first = self.offers[0].id
+        save_basket(self.user.id, {first: 4})
+        self.store.add(self.user.id, first, 1)
+        self.store.forget(self.user.id)
+        self.assertEqual(self.store.flush(), 0)
+        self.assertFalse(self.redis.exists(f"cart:{self.user.id}"))
+        self.assertEqual(self.store.get(self.user.id), {first: 4})
+
+
+class DatabaseCartTestCase(APITestCase):
+    def setUp(self):
+        self.user = baker.make(User)
+        self.client.force_authenticate(self.user)
+
+    def test_add_and_remove(self):
+        offer = baker.make(ProductInfo, shop=baker.make(Shop), quantity=1)
+        url = reverse("cart")
+        response = self.client.post(url, {"product_info_id": offer.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(load_basket(self.user.id), {offer.id: 1})
+        for product_info_id in (offer.id + 1, "abc", ""):
+            response = self.client.post(url, {"product_info_id": product_info_id})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.delete(url, {"product_info_id": offer.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(load_basket(self.user.id), {})
+
+
+class CartBatchTestCase(APITestCase):
+    def setUp(self):
+        self.user = baker.make(User)
+        self.client.force_authenticate(self.user)
+        shop = baker.make(Shop, state=True)
+        self.offers = [
+            offer.id
+            for offer in baker.make(ProductInfo, shop=shop, quantity=5, _quantity=4)
+        ]
+        self.hidden = baker.make(ProductInfo, shop=baker.make(Shop, state=False)).id
+
+    def post(self, items):
+        return self.client.post(reverse("cart-batch"), {"items": items}, format="json")
+
+    def test_lines_are_applied_in_one_call(self):
+        first, second, third, fourth = self.offers
+        save_basket(self.user.id, {first: 1, second: 2})
+        with self.assertNumQueries(8):
+            response = self.post(
+                [
+                    {"product_info_id": first, "quantity": 3},
+                    {"product_info_id": second, "quantity": 0},
+                    {"product_info_id": third, "quantity": 1},
+                    {"product_info_id": fourth, "quantity": 6},
+                    {"product_info_id": self.hidden, "quantity": 1},
+                    {"product_info_id": third, "quantity": 2},
+                    {"product_info_id": "x"},
+                ]
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row["status"] for row in response.data["results"]],
+            ["updated", "removed", "added", "error", "error", "error", "error"],
+        )
+        self.assertEqual(load_basket(self.user.id), {first: 3, third: 1})
+
+    def test_limits(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        items = [{"product_info_id": self.offers[0]}] * 101
+        self.assertEqual(self.post(items).status_code, 400)
@@ -0,0 +1,119 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from backend.models import Shop, Category, Product, ProductInfo
+
+
+class CatalogQueryBudgetTestCase(APITestCase):
+    """Catalog endpoints must run a constant number of queries per page."""
+
+    def add_catalog(self, shops=1, categories=1, products=1, offers=1):
+        for _ in range(shops):
+            shop = baker.make(Shop, state=True)
+            for _ in range(categories):
+                category = baker.make(Category)
+                category.shops.add(shop)
+                for _ in range(products):
+                    product = baker.make(
+                        Product, category=category, _fill_optional=["name"]
+                    )
+                    baker.make(
+                        ProductInfo, product=product, shop=shop, _quantity=offers
+                    )
+
+    def count_queries(self, url):
+        caches["catalog"].clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        self.add_catalog()
+        self.client.get(url)
+        small = self.count_queries(url)
+        self.add_catalog(shops=3, categories=4, products=5, offers=3)
+        large = self.count_queries(url)
+        self.assertEqual(small, large)
+
+    def test_shops(self):
+        self.assertConstantQueries(reverse("shops"))
+
+    def test_categories(self):
+        self.assertConstantQueries(reverse("category"))
+
+    def test_products(self):
+        self.assertConstantQueries(reverse("products"))
+
+    def test_search(self):
+        self.assertConstantQueries(reverse("search") + "?query=")
+
+
+class SparseFieldsetsTestCase(APITestCase):
+    def setUp(self):
+        shop = baker.make(Shop, state=True, name="Связной")
+        category = baker.make(Category, name="Смартфоны")
+        category.shops.add(shop)
+        product = baker.make(Product, category=category, name="iPhone")
+        baker.make(ProductInfo, product=product, shop=shop, price=100)
+
+    def test_depth_zero_skips_nested_objects(self):
+        full = self.client.get(reverse("shops"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("shops") + "?depth=0")
+        self.assertEqual(
+            list(response.data["results"][0]), ["id", "name", "state", "url"]
+        )
+        self.assertIn("categories", full.data["results"][0])
+        self.assertEqual(len(queries), 1)
+
+    def test_dotted_fields(self):
+        url = reverse("shops") + "?fields=name,categories.name"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(
+            response.data["results"],
+            [{"name": "Связной", "categories": [{"name": "Смартфоны"}]}],
+        )
+        self.assertEqual(len(queries), 2)
+
+    def test_nested_field_selects_subtree(self):
+        url = reverse("category") + "?fields=name,products.product_infos.price"
+        response = self.client.get(url)
+        self.assertEqual(
+            response.data["results"],
+            [{"name": "Смартфоны", "products": [{"product_infos": [{"price": 100}]}]}],
+        )
+
+    def test_invalid_depth(self):
+        response = self.client.get(reverse("products") + "?depth=deep")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        baker.make(Product, _quantity=25)
+
+    def test_walks_all_pages_without_count(self):
+        ids = []
+        url = reverse("products") + "?fields=id"
+        budgets = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            budgets.append(len(queries))
+            self.assertNotIn("count", response.data)
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, sorted(Product.objects.values_list("id", flat=True)))
+        self.assertEqual(len(set(budgets)), 1)
+
+    def test_page_number_fallback(self):
+        response = self.client.get(reverse("products") + "?page=3")
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 5)
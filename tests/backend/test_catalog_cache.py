@@ -0,0 +1,163 @@
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import parse_http_date
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from backend.catalog_cache import bump_catalog_version, get_catalog_version
+from backend.checkout import checkout
+from backend.importer import import_price_list
+from backend.models import (
+    Shop,
+    Category,
+    Order,
+    OrderItem,
+    Product,
+    ProductInfo,
+    User,
+)
+from backend.price_list import iter_price_list
+from tests.backend.test_import import DATA_DIR
+
+
+# long enough for the stock window not to roll over in the middle of a test
+@override_settings(CATALOG_STOCK_TIMEOUT=3600)
+class CatalogCacheTestCase(APITestCase):
+    def setUp(self):
+        self.shop = baker.make(Shop, state=True, name="Связной")
+        category = baker.make(Category, id=100, name="Телефоны")
+        baker.make(Product, name="Смартфон", category=category)
+
+    def test_second_request_is_served_from_cache(self):
+        url = reverse("products")
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url)
+        self.assertEqual(cached["X-Cache"], "HIT")
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(cached.data, response.data)
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get(reverse("shops") + "?fields=name&depth=0")
+        response = self.client.get(reverse("shops") + "?depth=0&fields=name")
+        self.assertEqual(response["X-Cache"], "HIT")
+        response = self.client.get(reverse("shops"))
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_import_bumps_version(self):
+        url = reverse("search") + "?query=iphone"
+        self.assertEqual(self.client.get(url).data["count"], 0)
+        version = get_catalog_version()
+        with open(DATA_DIR / "shop1.yaml", "rb") as stream:
+            with self.captureOnCommitCallbacks(execute=True):
+                import_price_list(self.shop, iter_price_list(stream))
+        self.assertGreater(get_catalog_version(), version)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["count"], 4)
+
+    def test_catalog_changes_bump_version(self):
+        self.client.get(reverse("category"))
+        with self.captureOnCommitCallbacks(execute=True):
+            baker.make(Category, name="Планшеты")
+        response = self.client.get(reverse("category"))
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_offer_changes_bump_version(self):
+        offer = baker.make(ProductInfo, shop=self.shop, price=100, quantity=1)
+        self.client.get(reverse("products"))
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.price = 90
+            offer.save()
+        self.assertEqual(self.client.get(reverse("products"))["X-Cache"], "MISS")
+
+    def test_checkout_does_not_bump_version(self):
+        buyer = baker.make(User)
+        offer = baker.make(ProductInfo, shop=self.shop, quantity=1)
+        order = baker.make(Order, user=buyer, state="basket")
+        baker.make(OrderItem, order=order, product_info=offer, quantity=1)
+        self.client.get(reverse("products"))
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(order)
+        self.assertEqual(get_catalog_version(), version)
+        self.assertEqual(self.client.get(reverse("products"))["X-Cache"], "HIT")
+
+        later = time.time() + settings.CATALOG_STOCK_TIMEOUT
+        with patch("backend.catalog_cache.time.time", return_value=later):
+            response = self.client.get(reverse("products"))
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_version_is_monotonic(self):
+        version = get_catalog_version()
+        self.assertGreater(bump_catalog_version(), version)
+        self.assertGreater(bump_catalog_version(), version + 1)
+
+    def test_stats(self):
+        url = reverse("products")
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get(url)
+        admin = baker.make(User, is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get(reverse("catalog-cache"))
+        self.assertEqual(response.data["hits"], 2)
+        self.assertEqual(response.data["misses"], 1)
+        self.assertEqual(response.data["version"], get_catalog_version())
+
+    def test_stats_require_admin(self):
+        self.client.force_authenticate(baker.make(User))
+        response = self.client.get(reverse("catalog-cache"))
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(CATALOG_STOCK_TIMEOUT=3600)
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        baker.make(Product, name="Смартфон", category=baker.make(Category))
+        self.url = reverse("products")
+
+    def test_if_none_match(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response["ETag"], etag)
+
+        bump_catalog_version()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_depends_on_query(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url + "?depth=0", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url)["Last-Modified"]
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        later = time.time() + 5
+        with patch("backend.catalog_cache.time.time", return_value=later):
+            bump_catalog_version()
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["Last-Modified"], last_modified)
+
+    def test_last_modified_does_not_run_ahead(self):
+        for _ in range(50):
+            bump_catalog_version()
+        response = self.client.get(self.url)
+        self.assertLessEqual(parse_http_date(response["Last-Modified"]), time.time())
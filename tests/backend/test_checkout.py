@@ -0,0 +1,98 @@
+from django.test import TransactionTestCase
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from backend.checkout import OutOfStock, checkout
+from backend.management.commands.bench_checkout import place_orders
+from backend.models import (
+    BestOffer,
+    Order,
+    OrderItem,
+    Product,
+    ProductInfo,
+    Shop,
+    User,
+)
+from backend.offers import refresh_best_offers
+
+
+class CheckoutTestCase(APITestCase):
+    def setUp(self):
+        self.user = baker.make(User)
+        self.order = baker.make(Order, user=self.user, state="basket")
+        self.first = baker.make(ProductInfo, shop=baker.make(Shop), quantity=5)
+        self.second = baker.make(ProductInfo, shop=baker.make(Shop), quantity=2)
+        baker.make(OrderItem, order=self.order, product_info=self.first, quantity=3)
+        baker.make(OrderItem, order=self.order, product_info=self.second, quantity=2)
+
+    def assertStock(self, first, second):
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.quantity, self.second.quantity), (first, second))
+
+    def test_reserves_stock(self):
+        checkout(self.order)
+        self.assertStock(2, 0)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.state, "new")
+
+    def test_shortage_rolls_back(self):
+        ProductInfo.objects.filter(id=self.second.id).update(quantity=1)
+        with self.assertRaises(OutOfStock) as context:
+            checkout(self.order)
+        self.assertEqual(context.exception.shortages, {self.second.id: (2, 1)})
+        self.assertStock(5, 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.state, "basket")
+
+    def test_disabled_shop_is_out_of_stock(self):
+        Shop.objects.filter(id=self.second.shop_id).update(state=False)
+        with self.assertRaises(OutOfStock) as context:
+            checkout(self.order)
+        self.assertEqual(context.exception.shortages, {self.second.id: (2, 0)})
+        self.assertStock(5, 2)
+
+    def test_refreshes_best_offers(self):
+        for offer in (self.first, self.second):
+            offer.product = baker.make(Product)
+            offer.save()
+        refresh_best_offers([self.first.product_id, self.second.product_id])
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.order)
+        self.assertEqual(
+            BestOffer.objects.get(product_id=self.first.product_id).quantity, 2
+        )
+        self.assertFalse(
+            BestOffer.objects.filter(product_id=self.second.product_id).exists()
+        )
+
+    def test_endpoint(self):
+        self.client.force_authenticate(self.user)
+        ProductInfo.objects.filter(id=self.first.id).update(quantity=0)
+        response = self.client.post(reverse("checkout"))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response.data["shortages"],
+            [{"product_info": self.first.id, "requested": 3, "available": 0}],
+        )
+
+        ProductInfo.objects.filter(id=self.first.id).update(quantity=3)
+        response = self.client.post(reverse("checkout"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["state"], "new")
+        self.assertStock(0, 0)
+
+        response = self.client.post(reverse("checkout"))
+        self.assertEqual(response.status_code, 400)
+
+
+class ConcurrentCheckoutTestCase(TransactionTestCase):
+    def test_no_overselling(self):
+        product_info = baker.make(ProductInfo, shop=baker.make(Shop), quantity=10)
+        buyers = baker.make(User, _quantity=30)
+        placed, rejected = place_orders(product_info, buyers, threads=8)
+        product_info.refresh_from_db()
+        self.assertEqual((placed, rejected), (10, 20))
+        self.assertEqual(product_info.quantity, 0)
+        self.assertEqual(Order.objects.filter(state="new").count(), 10)
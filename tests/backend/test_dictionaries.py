@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.test import TestCase, override_settings
+from model_bakery import baker
+
+from backend.dictionaries import category_names, parameter_names
+from backend.models import Category, Parameter, Product
+from backend.serializers import ProductSerializer
+
+
+class DictionaryCacheTestCase(TestCase):
+    def test_lookups_are_served_from_memory(self):
+        parameter = baker.make(Parameter, name="Цвет")
+        with self.captureOnCommitCallbacks(execute=True):
+            created = parameter_names.get_ids(["Цвет", "Вес"], create=True)
+        self.assertEqual(created["Цвет"], parameter.id)
+        self.assertEqual(Parameter.objects.get(name="Вес").id, created["Вес"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                parameter_names.get_ids(["Цвет", "Вес"]),
+                {"Цвет": parameter.id, "Вес": created["Вес"]},
+            )
+            self.assertEqual(parameter_names.get_name(created["Вес"]), "Вес")
+
+    def test_rolled_back_rows_are_not_published(self):
+        try:
+            with transaction.atomic():
+                parameter_names.get_ids(["Вес"], create=True)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Parameter.objects.exists())
+        self.assertEqual(parameter_names.get_ids(["Вес"]), {})
+
+    def test_renames_are_picked_up(self):
+        category = baker.make(Category, name="Смартфоны")
+        self.assertEqual(category_names.get_name(category.id), "Смартфоны")
+        category.name = "Телефоны"
+        category.save()
+        self.assertEqual(category_names.get_name(category.id), "Телефоны")
+
+    def test_ensure_creates_missing_rows(self):
+        category = baker.make(Category, name="Смартфоны")
+        with self.captureOnCommitCallbacks(execute=True):
+            category_names.ensure({category.id: "Смартфоны", 5: "Аксессуары"})
+        self.assertEqual(
+            dict(Category.objects.values_list("id", "name")),
+            {category.id: "Смартфоны", 5: "Аксессуары"},
+        )
+        with self.assertNumQueries(0):
+            category_names.ensure({category.id: "Смартфоны", 5: "Аксессуары"})
+            self.assertEqual(category_names.get_name(5), "Аксессуары")
+
+    def test_ensure_does_not_rename_shared_rows(self):
+        category = baker.make(Category, name="Смартфоны")
+        with self.assertRaisesMessage(ValueError, "«Смартфоны» вместо «Телефоны»"):
+            category_names.ensure({category.id: "Телефоны", 5: "Аксессуары"})
+        self.assertEqual(Category.objects.get(id=category.id).name, "Смартфоны")
+        self.assertEqual(category_names.get_name(category.id), "Смартфоны")
+
+    @override_settings(DICTIONARY_CHECK_INTERVAL=0)
+    def test_changes_in_other_processes_are_picked_up(self):
+        category = baker.make(Category, name="Смартфоны")
+        self.assertEqual(category_names.get_name(category.id), "Смартфоны")
+        # another process renames the row and bumps the shared version
+        Category.objects.filter(id=category.id).update(name="Телефоны")
+        self.assertEqual(category_names.get_name(category.id), "Смартфоны")
+        category_names.bump_version()
+        self.assertEqual(category_names.get_name(category.id), "Телефоны")
+
+        Category.objects.filter(id=category.id).delete()
+        category_names.bump_version()
+        self.assertIsNone(category_names.get_name(category.id))
+
+    def test_serializer_uses_cache(self):
+        category = baker.make(Category, name="Смартфоны")
+        products = baker.make(
+            Product, category=category, _quantity=3, _fill_optional=["name"]
+        )
+        category_names.get_name(category.id)
+        with self.assertNumQueries(3):
+            data = ProductSerializer(products, many=True).data
+        self.assertEqual({item["category"] for item in data}, {"Смартфоны"})
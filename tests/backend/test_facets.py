@@ -0,0 +1,115 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from backend.importer import import_price_list
+from backend.models import FacetCount, Shop
+from backend.price_list import iter_price_list
+from tests.backend.test_import import DATA_DIR
+
+
+class FacetsTestCase(APITestCase):
+    def setUp(self):
+        self.shop = baker.make(Shop)
+        with open(DATA_DIR / "shop1.yaml", "rb") as stream:
+            import_price_list(self.shop, iter_price_list(stream))
+
+    def get_facets(self, query=""):
+        response = self.client.get(reverse("product-facets") + query)
+        return {
+            facet["parameter"]: {row["value"]: row["count"] for row in facet["values"]}
+            for facet in response.data
+        }
+
+    def test_counts_are_precomputed_by_import(self):
+        self.assertEqual(
+            FacetCount.objects.get(parameter__name="Цвет", value="красный").offers, 1
+        )
+        with self.assertNumQueries(2):
+            facets = self.get_facets()
+        self.assertEqual(facets["Встроенная память (Гб)"], {"256": 3, "512": 1})
+
+    def test_filtered_counts(self):
+        facets = self.get_facets("?parameter=Встроенная память (Гб):256")
+        self.assertEqual(facets["Цвет"], {"красный": 1, "черный": 1, "синий": 1})
+        self.assertEqual(facets["Встроенная память (Гб)"], {"256": 3, "512": 1})
+
+        facets = self.get_facets(
+            "?parameter=Встроенная память (Гб):256&parameter=Цвет:черный"
+        )
+        self.assertEqual(facets["Встроенная память (Гб)"], {"256": 1})
+        self.assertEqual(facets["Цвет"], {"красный": 1, "черный": 1, "синий": 1})
+
+    def test_filter_products(self):
+        url = reverse("products") + "?parameter=Встроенная память (Гб):256"
+        response = self.client.get(url + "&parameter=Цвет:черный")
+        self.assertEqual(
+            [product["name"] for product in response.data["results"]],
+            ["Смартфон Apple iPhone XR 256GB (черный)"],
+        )
+        response = self.client.get(url + "&parameter=Встроенная память (Гб):512")
+        self.assertEqual(len(response.data["results"]), 4)
+        response = self.client.get(reverse("products") + "?parameter=Вес:1")
+        self.assertEqual(response.data["results"], [])
+
+    def test_reimport_updates_counts(self):
+        entries = [
+            ("categories", {"id": 224, "name": "Смартфоны"}),
+            (
+                "goods",
+                {
+                    "id": 4216292,
+                    "category": 224,
+                    "model": "apple/iphone/xs-max",
+                    "name": "Смартфон Apple iPhone XS Max 512GB (золотистый)",
+                    "price": 110000,
+                    "price_rrc": 116990,
+                    "quantity": 14,
+                    "parameters": {"Цвет": "красный"},
+                },
+            ),
+        ]
+        import_price_list(self.shop, entries)
+        self.assertEqual(self.get_facets()["Цвет"], {"красный": 1})
+        self.assertNotIn("Встроенная память (Гб)", self.get_facets())
+
+    def test_many_distinct_values(self):
+        entries = [("categories", {"id": 224, "name": "Смартфоны"})]
+        for number in range(1200):
+            entries.append(
+                (
+                    "goods",
+                    {
+                        "id": number,
+                        "category": 224,
+                        "model": "apple/iphone/xr",
+                        "name": f"Смартфон {number}",
+                        "price": 100,
+                        "price_rrc": 100,
+                        "quantity": 1,
+                        "parameters": {"Серийный номер": f"SN{number}"},
+                    },
+                )
+            )
+        import_price_list(self.shop, entries)
+        self.assertEqual(
+            FacetCount.objects.filter(parameter__name="Серийный номер").count(), 1200
+        )
+        self.assertFalse(FacetCount.objects.filter(parameter__name="Цвет").exists())
+
+    def test_rebuild(self):
+        expected = set(
+            FacetCount.objects.values_list("parameter_id", "value", "offers")
+        )
+        parameter = FacetCount.objects.get(value="256").parameter
+        FacetCount.objects.filter(value="256").update(offers=10)
+        FacetCount.objects.filter(value="512").delete()
+        baker.make(FacetCount, parameter=parameter, value="1024", offers=2)
+        call_command("rebuild_facet_counts", stdout=StringIO())
+        self.assertEqual(
+            set(FacetCount.objects.values_list("parameter_id", "value", "offers")),
+            expected,
+        )
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+from django.test import TestCase, override_settings
+from model_bakery import baker
+
+from backend.fetch import fetch_price_list, PriceListFetchError, PriceListTooLarge
+from backend.models import Shop, ImportJob, ProductInfo
+from backend.tasks import import_shop_price_list
+from tests.backend.utils import PriceListServer
+
+DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
+
+
+class FetchPriceListTestCase(TestCase):
+    def setUp(self):
+        self.content = (DATA_DIR / "shop1.yaml").read_bytes()
+        self.shop = baker.make(Shop)
+
+    def test_downloads_to_file(self):
+        with PriceListServer(self.content, last_modified="Mon, 01 Jan 2024") as server:
+            with fetch_price_list(self.shop, server.url) as fetched:
+                self.assertFalse(fetched.not_modified)
+                self.assertEqual(fetched.file.read(), self.content)
+                self.assertEqual(fetched.etag, '"v1"')
+                self.assertEqual(fetched.last_modified, "Mon, 01 Jan 2024")
+
+    def test_sends_stored_validators(self):
+        with PriceListServer(self.content) as server:
+            self.shop.url = server.url
+            self.shop.etag = '"v1"'
+            self.shop.last_modified = "Mon, 01 Jan 2024"
+            with fetch_price_list(self.shop, server.url) as fetched:
+                self.assertTrue(fetched.not_modified)
+                self.assertIsNone(fetched.file)
+        self.assertEqual(server.requests[0]["If-None-Match"], '"v1"')
+        self.assertEqual(server.requests[0]["If-Modified-Since"], "Mon, 01 Jan 2024")
+
+    def test_validators_ignored_for_other_url(self):
+        self.shop.url = "http://127.0.0.1/old.yaml"
+        self.shop.etag = '"v1"'
+        with PriceListServer(self.content) as server:
+            with fetch_price_list(self.shop, server.url) as fetched:
+                self.assertFalse(fetched.not_modified)
+        self.assertNotIn("If-None-Match", server.requests[0])
+
+    def test_size_cap(self):
+        with PriceListServer(self.content) as server:
+            with self.assertRaises(PriceListTooLarge):
+                with fetch_price_list(self.shop, server.url, max_size=100):
+                    pass
+
+    def test_unreachable_url(self):
+        with PriceListServer() as server:
+            url = server.url
+        with self.assertRaises(PriceListFetchError):
+            with fetch_price_list(self.shop, url, timeout=1):
+                pass
+
+
+class ImportTaskFetchTestCase(TestCase):
+    def test_second_import_short_circuits_on_304(self):
+        shop = baker.make(Shop)
+        content = (DATA_DIR / "shop1.yaml").read_bytes()
+        with PriceListServer(content) as server:
+            first = baker.make(ImportJob, shop=shop, url=server.url)
+            import_shop_price_list(first.id)
+            second = baker.make(ImportJob, shop=shop, url=server.url)
+            with override_settings(PRICE_LIST_MAX_SIZE=1):
+                import_shop_price_list(second.id)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        shop.refresh_from_db()
+        self.assertEqual(first.state, "done")
+        self.assertEqual(second.state, "skipped")
+        self.assertEqual(shop.etag, '"v1"')
+        self.assertEqual(ProductInfo.objects.filter(shop=shop).count(), 4)
@@ -0,0 +1,292 @@
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from multiprocessing import get_context
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory, TemporaryFile
+import tracemalloc
+from unittest.mock import patch
+
+from django.core.management import call_command, CommandError
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.test import APITestCase
+from yaml import safe_load
+
+from backend.importer import _product_ids, import_price_list
+from backend.management.commands.bench_import import (
+    generate_price_list,
+    write_price_list,
+)
+from backend.management.commands.import_shops import import_file, init_worker
+from backend.models import (
+    User,
+    Shop,
+    Category,
+    ProductInfo,
+    Parameter,
+    ProductParameter,
+    ImportJob,
+    Order,
+    OrderItem,
+    Product,
+)
+from backend.price_list import iter_price_list
+from backend.tasks import import_shop_price_list
+from tests.backend.utils import PriceListServer
+
+DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
+
+
+class PriceListParserTestCase(TestCase):
+    def test_matches_full_document(self):
+        with open(DATA_DIR / "shop1.yaml", "rb") as stream:
+            document = safe_load(stream)
+            stream.seek(0)
+            entries = list(iter_price_list(stream))
+
+        self.assertEqual(entries[0], ("shop", "Связной"))
+        for section in ("categories", "goods"):
+            self.assertEqual(
+                [value for key, value in entries if key == section],
+                document[section],
+            )
+
+    def test_memory_does_not_grow_with_file_size(self):
+        peaks = []
+        for items in (200, 2000):
+            with TemporaryFile() as stream:
+                write_price_list(stream, generate_price_list(items, parameters=2))
+                stream.seek(0)
+                tracemalloc.start()
+                for _ in iter_price_list(stream):
+                    pass
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        self.assertLess(peaks[1], peaks[0] * 2)
+
+
+class ImportPriceListTestCase(TestCase):
+    def setUp(self):
+        self.shop = baker.make(Shop, name="Связной")
+
+    def test_import_shop_file(self):
+        with open(DATA_DIR / "shop1.yaml", "rb") as stream:
+            result = import_price_list(self.shop, iter_price_list(stream))
+
+        self.assertEqual(result.rows, 4)
+        self.assertEqual(ProductInfo.objects.filter(shop=self.shop).count(), 4)
+        self.assertEqual(Parameter.objects.count(), 4)
+        self.assertEqual(ProductParameter.objects.count(), 16)
+        self.assertEqual(self.shop.categories.count(), 3)
+        self.assertEqual(
+            ProductParameter.objects.get(
+                product_info__external_id=4216292, parameter__name="Цвет"
+            ).value,
+            "золотистый",
+        )
+
+    def test_reimport_unchanged_file_writes_nothing(self):
+        import_price_list(self.shop, generate_price_list(20))
+        ids = set(ProductInfo.objects.values_list("id", flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            result = import_price_list(self.shop, generate_price_list(20))
+
+        self.assertEqual(result.unchanged, 20)
+        self.assertEqual((result.inserted, result.updated, result.removed), (0, 0, 0))
+        self.assertEqual(set(ProductInfo.objects.values_list("id", flat=True)), ids)
+        self.assertFalse(
+            [query for query in queries if query["sql"].startswith("INSERT")]
+        )
+        self.assertEqual(Category.objects.count(), 20)
+
+    def test_sync_applies_differences(self):
+        import_price_list(self.shop, generate_price_list(5, parameters=2))
+        kept = ProductInfo.objects.get(external_id=0)
+        entries = list(generate_price_list(5, parameters=2))
+        goods = [value for section, value in entries if section == "goods"]
+        goods[1]["price"] = 1
+        goods[2]["parameters"]["Параметр 0"] = "новое"
+        del goods[3]["parameters"]["Параметр 1"]
+        goods[4]["id"] = 100
+        entries = [(section, value) for section, value in entries if section != "goods"]
+        entries += [("goods", item) for item in goods]
+
+        result = import_price_list(self.shop, entries)
+
+        self.assertEqual(
+            (result.inserted, result.updated, result.unchanged, result.removed),
+            (1, 3, 1, 1),
+        )
+        self.assertEqual(ProductInfo.objects.get(external_id=0).id, kept.id)
+        self.assertEqual(ProductInfo.objects.get(external_id=1).price, 1)
+        self.assertEqual(
+            ProductParameter.objects.get(
+                product_info__external_id=2, parameter__name="Параметр 0"
+            ).value,
+            "новое",
+        )
+        self.assertEqual(
+            ProductParameter.objects.filter(product_info__external_id=3).count(), 1
+        )
+        self.assertFalse(ProductInfo.objects.filter(external_id=4).exists())
+        self.assertEqual(
+            ProductParameter.objects.filter(product_info__external_id=100).count(), 2
+        )
+
+    def test_ordered_offers_are_kept_without_stock(self):
+        import_price_list(self.shop, generate_price_list(3))
+        ordered = ProductInfo.objects.get(external_id=1)
+        in_basket = ProductInfo.objects.get(external_id=2)
+        delivered = baker.make(Order, user=baker.make(User), state="delivered")
+        baker.make(OrderItem, order=delivered, product_info=ordered, quantity=1)
+        basket = baker.make(Order, user=baker.make(User), state="basket")
+        baker.make(OrderItem, order=basket, product_info=in_basket, quantity=1)
+        entries = [
+            (section, value)
+            for section, value in generate_price_list(3)
+            if section != "goods" or value["id"] == 0
+        ]
+
+        result = import_price_list(self.shop, entries)
+
+        self.assertEqual(result.removed, 2)
+        ordered.refresh_from_db()
+        self.assertEqual(ordered.quantity, 0)
+        self.assertTrue(delivered.ordered_items.exists())
+        self.assertFalse(ProductInfo.objects.filter(id=in_basket.id).exists())
+        self.assertEqual(import_price_list(self.shop, entries).removed, 0)
+
+        result = import_price_list(self.shop, generate_price_list(3))
+        self.assertEqual((result.inserted, result.updated), (1, 1))
+        ordered.refresh_from_db()
+        self.assertGreater(ordered.quantity, 0)
+
+    def test_products_inserted_meanwhile_are_shared(self):
+        import_price_list(self.shop, generate_price_list(3))
+        products = set(Product.objects.values_list("id", flat=True))
+        lookups = iter([{}])
+
+        def product_ids(keys):
+            # the first lookup misses rows another import just committed
+            return next(lookups, None) or _product_ids(keys)
+
+        with patch("backend.importer._product_ids", side_effect=product_ids):
+            result = import_price_list(baker.make(Shop), generate_price_list(3))
+        self.assertEqual(result.inserted, 3)
+        self.assertEqual(set(Product.objects.values_list("id", flat=True)), products)
+        self.assertEqual(
+            set(ProductInfo.objects.values_list("product_id", flat=True)), products
+        )
+
+    def test_offers_are_unique_per_shop(self):
+        baker.make(ProductInfo, shop=self.shop, external_id=1)
+        with self.assertRaises(IntegrityError):
+            baker.make(ProductInfo, shop=self.shop, external_id=1)
+
+    def test_category_of_another_name_fails_import(self):
+        baker.make(Category, id=224, name="Телефоны")
+        with open(DATA_DIR / "shop1.yaml", "rb") as stream:
+            with self.assertRaisesMessage(ValueError, "«Телефоны» вместо «Смартфоны»"):
+                import_price_list(self.shop, iter_price_list(stream))
+        self.assertEqual(Category.objects.get(id=224).name, "Телефоны")
+        self.assertFalse(ProductInfo.objects.exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            import_price_list(baker.make(Shop), generate_price_list(1, parameters=1))
+        counts = []
+        for items in (10, 100):
+            shop = baker.make(Shop)
+            data = generate_price_list(items, parameters=1)
+            with CaptureQueriesContext(connection) as queries:
+                import_price_list(shop, data, batch_size=500)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class ImportJobTestCase(APITestCase):
+    def setUp(self):
+        self.user = baker.make(User, type="shop")
+        self.shop = baker.make(Shop, user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def test_update_shop_returns_job(self):
+        url = reverse("shop-update")
+        data = {"shop_id": self.shop.id, "url": "https://example.com/shop1.yaml"}
+        with patch("backend.views.import_shop_price_list.delay") as delay:
+            delay.return_value.id = "task-id"
+            response = self.client.put(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = ImportJob.objects.get(id=response.data["job_id"])
+        self.assertEqual(job.state, "pending")
+        delay.assert_called_once_with(job.id)
+
+    def test_import_task_reports_progress(self):
+        content = (DATA_DIR / "shop1.yaml").read_bytes()
+        with PriceListServer(content) as server:
+            job = baker.make(ImportJob, shop=self.shop, url=server.url)
+            import_shop_price_list(job.id)
+
+        response = self.client.get(reverse("shop-import", args=[job.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["state"], "done")
+        self.assertEqual(response.data["rows_processed"], 4)
+        self.assertEqual(response.data["inserted"], 4)
+        self.assertEqual(response.data["errors"], [])
+
+    def test_import_task_records_errors(self):
+        with PriceListServer(b"- 1\n- 2\n") as server:
+            job = baker.make(ImportJob, shop=self.shop, url=server.url)
+            import_shop_price_list(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, "failed")
+        self.assertEqual(len(job.errors), 1)
+
+    def test_foreign_job_not_found(self):
+        job = baker.make(ImportJob, url="https://example.com/")
+        response = self.client.get(reverse("shop-import", args=[job.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+def import_in_new_database(path):
+    """Run ``import_file`` in a pool process against a database of its own."""
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    name, result, _ = import_file(path)
+    return name, result.inserted
+
+
+class ImportShopsCommandTestCase(TestCase):
+    def test_imports_directory_and_skips_unchanged(self):
+        output = StringIO()
+        call_command("import_shops", str(DATA_DIR), workers=1, stdout=output)
+        shop = Shop.objects.get(name="Связной")
+        self.assertEqual(ProductInfo.objects.filter(shop=shop).count(), 4)
+        self.assertIn("rows: 4", output.getvalue())
+        self.assertIn("rows/s", output.getvalue())
+
+        output = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("import_shops", str(DATA_DIR), workers=1, stdout=output)
+        self.assertIn("skipped", output.getvalue())
+        self.assertEqual(len(queries), 1)
+
+    def test_spawned_worker_imports(self):
+        path = DATA_DIR / "shop1.yaml"
+        with TemporaryDirectory() as directory, patch.dict(
+            os.environ,
+            DB_ENGINE="django.db.backends.sqlite3",
+            DB_NAME=os.path.join(directory, "worker.sqlite3"),
+        ), ProcessPoolExecutor(
+            1, mp_context=get_context("spawn"), initializer=init_worker
+        ) as executor:
+            name, inserted = executor.submit(import_in_new_database, path).result()
+        self.assertEqual((name, inserted), ("Связной", 4))
+
+    def test_no_files(self):
+        with self.assertRaises(CommandError):
+            call_command("import_shops", str(DATA_DIR / "*.csv"), workers=1)
@@ -0,0 +1,101 @@
+from unittest.mock import patch
+
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from backend.catalog_cache import catalog_cache
+from backend.mail import WAKEUP_KEY, deliver_queued_mail, queue_mail
+from backend.models import QueuedEmail
+from backend.tasks import new_order, send_queued_mail
+from tests.backend.utils import SMTPServer
+
+
+def smtp_settings(server, **extra):
+    return override_settings(
+        EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+        EMAIL_HOST="127.0.0.1",
+        EMAIL_PORT=server.port,
+        EMAIL_HOST_USER="shop@example.com",
+        EMAIL_HOST_PASSWORD="",
+        EMAIL_USE_SSL=False,
+        **extra,
+    )
+
+
+@patch("backend.tasks.send_queued_mail.delay")
+class MailQueueTestCase(TestCase):
+    def queue(self, count):
+        for number in range(count):
+            queue_mail("Тема", f"Письмо {number}", [f"user{number}@example.com"])
+
+    def test_batches_share_one_connection(self, delay):
+        self.queue(7)
+        with SMTPServer() as server, smtp_settings(server, EMAIL_BATCH_SIZE=3):
+            self.assertEqual(send_queued_mail.apply().get(), 7)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.messages), 7)
+        self.assertEqual(QueuedEmail.objects.filter(state="sent").count(), 7)
+
+    def test_task_queues_message(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            new_order("buyer@example.com")
+        email = QueuedEmail.objects.get()
+        self.assertEqual(email.recipients, ["buyer@example.com"])
+        delay.assert_called_once_with()
+
+    def test_burst_wakes_one_sender(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.queue(5)
+        delay.assert_called_once_with()
+        self.assertTrue(catalog_cache().get(WAKEUP_KEY))
+        with SMTPServer() as server, smtp_settings(server):
+            send_queued_mail.apply()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.queue(1)
+        self.assertEqual(delay.call_count, 2)
+
+    def test_expired_lease_is_claimed_again(self, delay):
+        self.queue(2)
+        leased = timezone.now() + timedelta(minutes=5)
+        QueuedEmail.objects.update(state="sending", next_attempt_at=leased)
+        with SMTPServer() as server, smtp_settings(server):
+            self.assertEqual(deliver_queued_mail(), 0)
+            QueuedEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(deliver_queued_mail(), 2)
+        self.assertEqual(QueuedEmail.objects.filter(state="sent").count(), 2)
+
+    def test_refused_message_is_retried_with_backoff(self, delay):
+        queue_mail("Тема", "Текст", ["missing@example.com"])
+        queue_mail("Тема", "Текст", ["user@example.com"])
+        with SMTPServer(refuse=["missing@example.com"]) as server, smtp_settings(
+            server, EMAIL_MAX_ATTEMPTS=2
+        ):
+            self.assertEqual(deliver_queued_mail(), 2)
+            refused = QueuedEmail.objects.get(recipients=["missing@example.com"])
+            self.assertEqual((refused.state, refused.attempts), ("queued", 1))
+            self.assertGreater(refused.next_attempt_at, refused.created_at)
+            self.assertEqual(deliver_queued_mail(), 0)
+
+            QueuedEmail.objects.update(next_attempt_at=refused.created_at)
+            self.assertEqual(deliver_queued_mail(), 1)
+        refused.refresh_from_db()
+        self.assertEqual(refused.state, "failed")
+        self.assertIn("No such user", refused.last_error)
+
+    def test_dropped_connection_keeps_sent_messages(self, delay):
+        self.queue(3)
+        with SMTPServer(drop_after=2) as server, smtp_settings(server):
+            with self.assertRaises(OSError):
+                deliver_queued_mail()
+        self.assertEqual(QueuedEmail.objects.filter(state="sent").count(), 1)
+        self.assertEqual(QueuedEmail.objects.filter(state="queued").count(), 2)
+
+    def test_rate_limit(self, delay):
+        self.queue(3)
+        with SMTPServer() as server, smtp_settings(server):
+            with patch("backend.mail.sleep") as sleep:
+                deliver_queued_mail(rate_limit=10)
+        self.assertEqual(sleep.call_count, 3)
+        self.assertGreater(max(call.args[0] for call in sleep.call_args_list), 0.05)
@@ -0,0 +1,85 @@
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from backend.importer import import_price_list
+from backend.models import BestOffer, Product, Shop, User
+from backend.offers import refresh_best_offers
+
+
+def price_list(*goods):
+    yield "categories", {"id": 224, "name": "Смартфоны"}
+    for external_id, name, price, quantity in goods:
+        yield "goods", {
+            "id": external_id,
+            "category": 224,
+            "model": "apple/iphone/xr",
+            "name": name,
+            "price": price,
+            "price_rrc": price,
+            "quantity": quantity,
+            "parameters": {},
+        }
+
+
+class BestOfferTestCase(APITestCase):
+    def setUp(self):
+        self.user = baker.make(User, type="shop")
+        self.first = baker.make(Shop, state=True, user=self.user)
+        self.second = baker.make(Shop, state=True)
+        import_price_list(
+            self.first,
+            price_list((1, "iPhone XR", 65000, 5), (2, "iPhone XS", 90000, 1)),
+        )
+        import_price_list(
+            self.second,
+            price_list((7, "iPhone XR", 63000, 2), (8, "iPhone XS", 80000, 0)),
+        )
+        self.xr = Product.objects.get(name="iPhone XR")
+        self.xs = Product.objects.get(name="iPhone XS")
+
+    def test_import_maintains_best_offers(self):
+        best = BestOffer.objects.get(product=self.xr)
+        self.assertEqual(
+            (best.shop, best.price, best.quantity), (self.second, 63000, 2)
+        )
+        self.assertEqual(best.offers, 2)
+        best = BestOffer.objects.get(product=self.xs)
+        self.assertEqual((best.shop, best.price, best.offers), (self.first, 90000, 1))
+
+        import_price_list(self.second, price_list((8, "iPhone XS", 80000, 3)))
+        best = BestOffer.objects.get(product=self.xs)
+        self.assertEqual((best.shop, best.price, best.offers), (self.second, 80000, 2))
+        best = BestOffer.objects.get(product=self.xr)
+        self.assertEqual((best.shop, best.price, best.offers), (self.first, 65000, 1))
+
+        import_price_list(self.first, price_list((2, "iPhone XS", 90000, 1)))
+        self.assertFalse(BestOffer.objects.filter(product=self.xr).exists())
+
+    def test_disabled_shop_is_skipped(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.put(reverse("shop-update-status"), {"state": "off"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(BestOffer.objects.get(product=self.xr).shop, self.second)
+        self.assertFalse(BestOffer.objects.filter(product=self.xs).exists())
+
+    def test_endpoint(self):
+        response = self.client.get(reverse("best-offers"))
+        self.assertEqual(
+            [
+                (row["name"], row["price"], row["offers"])
+                for row in response.data["results"]
+            ],
+            [("iPhone XR", 63000, 2), ("iPhone XS", 90000, 1)],
+        )
+        response = self.client.get(reverse("best-offers") + f"?product={self.xs.id}")
+        self.assertEqual(
+            [row["product"] for row in response.data["results"]], [self.xs.id]
+        )
+
+    def test_refresh_upserts_existing_rows(self):
+        BestOffer.objects.filter(product=self.xr).update(price=1, offers=9)
+        refresh_best_offers([self.xr.id, self.xs.id])
+        best = BestOffer.objects.get(product=self.xr)
+        self.assertEqual((best.shop, best.price, best.offers), (self.second, 63000, 2))
+        self.assertEqual(BestOffer.objects.count(), 2)
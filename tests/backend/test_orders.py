@@ -0,0 +1,171 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from backend.models import Order, OrderItem, OutboxEvent, ProductInfo, Shop, User
+
+
+class OrderHistoryTestCase(APITestCase):
+    def setUp(self):
+        self.user = baker.make(User)
+        self.client.force_authenticate(self.user)
+        shop = baker.make(Shop)
+        self.cheap = baker.make(ProductInfo, shop=shop, price=100)
+        self.expensive = baker.make(ProductInfo, shop=shop, price=2500)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = baker.make(Order, user=self.user, state="new")
+            baker.make(OrderItem, order=order, product_info=self.cheap, quantity=3)
+            baker.make(OrderItem, order=order, product_info=self.expensive, quantity=2)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("user-orders"))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_totals(self):
+        self.add_orders(1)
+        baker.make(Order, user=self.user, state="basket")
+        baker.make(Order, user=self.user, state="canceled")
+        response = self.client.get(reverse("user-orders"))
+        orders = response.data["results"]
+        self.assertEqual(
+            [
+                (order["state"], order["items_count"], order["total"])
+                for order in orders
+            ],
+            [("canceled", 0, 0), ("new", 2, 5300)],
+        )
+        self.assertEqual(len(orders[1]["items"]), 2)
+
+    def test_constant_queries(self):
+        self.add_orders(1)
+        small = self.count_queries()
+        self.add_orders(20)
+        self.assertEqual(self.count_queries(), small)
+
+
+@override_settings(SHOP_ORDER_FEED_LAG=0)
+class ShopOrderFeedTestCase(APITestCase):
+    def setUp(self):
+        self.user = baker.make(User, type="shop")
+        self.client.force_authenticate(self.user)
+        self.offer = baker.make(ProductInfo, shop=baker.make(Shop, user=self.user))
+        self.other = baker.make(ProductInfo, shop=baker.make(Shop))
+
+    def make_order(self, *offers, state="new"):
+        order = baker.make(Order, user=baker.make(User), state=state)
+        for offer in offers:
+            baker.make(OrderItem, order=order, product_info=offer, quantity=1)
+        return order
+
+    def poll(self, since=None, **params):
+        if since:
+            params["since"] = since
+        response = self.client.get(reverse("shop-orders"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_only_own_lines(self):
+        mixed = self.make_order(self.offer, self.other)
+        self.make_order(self.other)
+        self.make_order(self.offer, state="basket")
+        data = self.poll()
+        self.assertEqual([order["id"] for order in data["results"]], [mixed.id])
+        self.assertEqual(
+            [item["product_info"] for item in data["results"][0]["items"]],
+            [self.offer.id],
+        )
+
+    def test_since_returns_new_and_changed_orders(self):
+        first = self.make_order(self.offer)
+        second = self.make_order(self.offer)
+        data = self.poll(limit=1)
+        self.assertEqual([order["id"] for order in data["results"]], [first.id])
+        data = self.poll(data["next_since"])
+        self.assertEqual([order["id"] for order in data["results"]], [second.id])
+        since = data["next_since"]
+        self.assertEqual(self.poll(since), {"results": [], "next_since": since})
+
+        first.state = "confirmed"
+        first.save()
+        third = self.make_order(self.offer)
+        data = self.poll(since)
+        self.assertEqual(
+            [order["id"] for order in data["results"]], [first.id, third.id]
+        )
+
+    def test_recent_changes_are_held_back(self):
+        order = self.make_order(self.offer)
+        with override_settings(SHOP_ORDER_FEED_LAG=60):
+            self.assertEqual(self.poll()["results"], [])
+            Order.objects.filter(id=order.id).update(
+                updated_at=timezone.now() - timedelta(minutes=2)
+            )
+            self.assertEqual(
+                [order["id"] for order in self.poll()["results"]], [order.id]
+            )
+
+    def test_invalid_cursor(self):
+        for since in ["abc", "99999999999999999999.1"]:
+            response = self.client.get(reverse("shop-orders"), {"since": since})
+            self.assertEqual(response.status_code, 400)
+
+
+class BulkOrderStateTestCase(APITestCase):
+    def setUp(self):
+        self.shop_user = baker.make(User, type="shop")
+        self.client.force_authenticate(self.shop_user)
+        self.offer = baker.make(ProductInfo, shop=baker.make(Shop, user=self.shop_user))
+        self.buyers = baker.make(User, _quantity=2)
+
+    def make_order(self, buyer, state, offer=None):
+        order = baker.make(Order, user=buyer, state=state)
+        baker.make(OrderItem, order=order, product_info=offer or self.offer)
+        return order
+
+    def test_transitions(self):
+        first, second = self.buyers
+        confirmed = [self.make_order(first, "confirmed") for _ in range(3)]
+        sent = self.make_order(second, "sent")
+        new = self.make_order(second, "new")
+        foreign = self.make_order(second, "new", baker.make(ProductInfo))
+        payload = [{"id": order.id, "state": "assembled"} for order in confirmed]
+        payload += [
+            {"id": sent.id, "state": "delivered"},
+            {"id": new.id, "state": "sent"},
+            {"id": foreign.id, "state": "confirmed"},
+        ]
+        response = self.client.post(
+            reverse("shop-orders-state"), {"orders": payload}, format="json"
+        )
+        self.assertEqual(
+            [row["updated"] for row in response.data["results"]],
+            [True, True, True, True, False, False],
+        )
+        self.assertEqual(
+            set(Order.objects.values_list("state", flat=True)),
+            {"assembled", "delivered", "new"},
+        )
+        events = {
+            event.payload["email"]: event.payload["orders"]
+            for event in OutboxEvent.objects.filter(event="orders.state_changed")
+        }
+        self.assertEqual(len(events), 2)
+        self.assertEqual(len(events[first.email]), 3)
+        self.assertEqual(events[second.email], [[sent.id, "delivered"]])
+
+    def test_bad_payload(self):
+        url = reverse("shop-orders-state")
+        response = self.client.post(url, {"orders": [{"id": "x"}]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {}, format="json")
+        self.assertEqual(response.status_code, 400)
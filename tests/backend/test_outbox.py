@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from backend.models import OutboxEvent
+from backend.outbox import publish_event, relay_outbox
+
+
+class OutboxTestCase(APITestCase):
+    def test_registration_writes_event_instead_of_publishing(self):
+        with patch("backend.tasks.new_user_registered.apply_async") as apply_async:
+            response = self.client.post(
+                reverse("user-register"),
+                {
+                    "email": "buyer@example.com",
+                    "username": "buyer",
+                    "password": "Sup3r-secret-pass",
+                },
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        apply_async.assert_not_called()
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.event, "user.registered")
+        self.assertEqual(event.payload["email"], "buyer@example.com")
+
+    def test_rolled_back_event_is_not_published(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                publish_event("order.created", email="buyer@example.com")
+                raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_relay_publishes_in_batches(self):
+        for number in range(5):
+            publish_event("order.created", email=f"user{number}@example.com")
+        with patch("backend.tasks.new_order.apply_async") as apply_async:
+            self.assertEqual(relay_outbox(batch_size=3), 3)
+            self.assertEqual(relay_outbox(batch_size=3), 2)
+            self.assertEqual(relay_outbox(batch_size=3), 0)
+        self.assertEqual(apply_async.call_count, 5)
+        self.assertEqual(
+            apply_async.call_args_list[0].kwargs,
+            {"kwargs": {"email": "user0@example.com"}},
+        )
+        self.assertFalse(OutboxEvent.objects.filter(published_at=None).exists())
+
+    def test_broker_failure_keeps_events_pending(self):
+        publish_event("order.created", email="first@example.com")
+        publish_event("order.created", email="second@example.com")
+        with patch(
+            "backend.tasks.new_order.apply_async",
+            side_effect=[None, ConnectionError("broker is down")],
+        ):
+            with self.assertRaises(ConnectionError):
+                relay_outbox()
+        pending = OutboxEvent.objects.filter(published_at=None)
+        self.assertEqual(
+            [event.payload["email"] for event in pending], ["second@example.com"]
+        )
+
+    def test_unknown_event(self):
+        with self.assertRaises(ValueError):
+            publish_event("user.deleted")
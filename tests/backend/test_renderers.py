@@ -0,0 +1,32 @@
+from decimal import Decimal
+import json
+
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from backend.renderers import JSON_BACKENDS, FastJSONRenderer
+
+PAYLOAD = {
+    "name": "Смартфон / iPhone",
+    "price": Decimal("65000.50"),
+    "label": gettext_lazy("Магазин"),
+    "items": [{"id": 1, "state": True, "url": None}],
+}
+
+
+class FastJSONRendererTestCase(APITestCase):
+    def test_backends_match_stock_renderer(self):
+        expected = json.loads(JSONRenderer().render(PAYLOAD))
+        for name in JSON_BACKENDS:
+            with self.subTest(backend=name):
+                renderer = FastJSONRenderer()
+                renderer.backend = name
+                self.assertEqual(json.loads(renderer.render(PAYLOAD)), expected)
+
+    def test_malformed_body(self):
+        response = self.client.post(
+            reverse("user-login"), "{", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,77 @@
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from backend.catalog_cache import bump_catalog_version
+from backend.importer import import_price_list
+from backend.models import Product, Shop
+from backend.price_list import iter_price_list
+from backend.search import InvertedIndexSearch, search_products, tokenize
+from tests.backend.test_import import DATA_DIR
+
+
+class InvertedIndexTestCase(APITestCase):
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize("Смартфон Apple iPhone-XR (чёрный)"),
+            [
+                "смартфон",
+                "apple",
+                "iphone",
+                "xr",
+                "черный",
+            ],
+        )
+
+    def test_ranks_exact_before_prefix_matches(self):
+        index = InvertedIndexSearch()
+        index.index_products(
+            [
+                (1, "Чехол для iPhone XR"),
+                (2, "iPhone XR 128GB"),
+                (3, "iPhoneX"),
+                (4, "Pixel"),
+            ]
+        )
+        self.assertEqual(index.rank("iphone xr"), [1, 2])
+        self.assertEqual(index.rank("iphone"), [1, 2, 3])
+        self.assertEqual(index.rank("pix"), [4])
+        self.assertEqual(index.rank("galaxy"), [])
+
+    def test_endpoint_is_ranked_and_paginated(self):
+        for number in range(15):
+            baker.make(Product, name=f"Смартфон {number}")
+        baker.make(Product, name="Смартфон")
+        baker.make(Product, name="Планшет")
+        response = self.client.get(reverse("search") + "?query=смартфон")
+        self.assertEqual(response.data["count"], 16)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(response.data["results"][0]["name"], "Смартфон 0")
+
+        response = self.client.get(reverse("search") + "?query=смартфон&page=2")
+        self.assertEqual(len(response.data["results"]), 6)
+
+    def test_imported_products_are_searchable(self):
+        shop = baker.make(Shop)
+        with open(DATA_DIR / "shop1.yaml", "rb") as stream:
+            with self.captureOnCommitCallbacks(execute=True):
+                import_price_list(shop, iter_price_list(stream))
+        response = self.client.get(reverse("search") + "?query=iphone 256gb")
+        self.assertEqual(
+            [product["name"] for product in response.data["results"]],
+            [
+                "Смартфон Apple iPhone XR 256GB (красный)",
+                "Смартфон Apple iPhone XR 256GB (черный)",
+            ],
+        )
+
+    def test_changes_from_other_processes_rebuild_the_index(self):
+        phone = baker.make(Product, name="Смартфон")
+        tablet = baker.make(Product, name="Планшет")
+        self.assertEqual(search_products("смартфон", Product.objects)[:], [phone])
+        # another process renames products without our signals
+        Product.objects.filter(id=phone.id).update(name="Телефон")
+        Product.objects.filter(id=tablet.id).update(name="Смартфон")
+        bump_catalog_version()
+        self.assertEqual(search_products("смартфон", Product.objects)[:], [tablet])
+        self.assertEqual(search_products("телефон", Product.objects)[:], [phone])
@@ -0,0 +1,119 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Thread
+
+
+class PriceListServer:
+    """Local HTTP stand-in for a supplier serving a single price list."""
+
+    def __init__(self, content=b"", etag='"v1"', last_modified=""):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(dict(self.headers))
+                if server.etag and self.headers.get("If-None-Match") == server.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(server.content)))
+                if server.etag:
+                    self.send_header("ETag", server.etag)
+                if server.last_modified:
+                    self.send_header("Last-Modified", server.last_modified)
+                self.end_headers()
+                self.wfile.write(server.content)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}/shop.yaml"
+
+    def __enter__(self):
+        Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SMTPServer:
+    """Local SMTP debugging server recording the messages it accepts.
+
+    Recipients listed in ``refuse`` are rejected; after ``drop_after``
+    messages the server hangs up on the client.
+    """
+
+    def __init__(self, refuse=(), drop_after=None):
+        self.refuse = set(refuse)
+        self.drop_after = drop_after
+        self.connections = 0
+        self.messages = []
+        server = self
+
+        class Handler(StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                server.connections += 1
+                self.reply("220 localhost")
+                recipients = []
+                for raw in self.rfile:
+                    command = raw.decode().strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb in ("EHLO", "HELO"):
+                        self.reply("250 localhost")
+                    elif verb == "MAIL":
+                        recipients = []
+                        self.reply("250 OK")
+                    elif verb == "RCPT":
+                        address = command.split(":", 1)[1].strip("<> ")
+                        if address in server.refuse:
+                            self.reply("550 No such user")
+                        else:
+                            recipients.append(address)
+                            self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        lines = []
+                        for line in self.rfile:
+                            if line.rstrip(b"\r\n") == b".":
+                                break
+                            lines.append(line)
+                        server.messages.append((recipients, b"".join(lines)))
+                        if len(server.messages) == server.drop_after:
+                            return
+                        self.reply("250 OK")
+                    elif verb == "RSET":
+                        self.reply("250 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Not implemented")
+
+        self.tcp = ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.tcp.daemon_threads = True
+
+    @property
+    def port(self):
+        return self.tcp.server_address[1]
+
+    def __enter__(self):
+        Thread(target=self.tcp.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tcp.shutdown()
+        self.tcp.server_close()
@@ -0,0 +1,21 @@
+import pytest
+from django.core.cache import caches
+
+from backend.carts import reset_cart_store
+from backend.dictionaries import clear_dictionaries
+from backend.search import get_search_backend
+
+
+def _clear():
+    clear_dictionaries()
+    get_search_backend().clear()
+    reset_cart_store()
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _clear_process_caches():
+    _clear()
+    yield
+    _clear()